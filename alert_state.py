@@ -0,0 +1,118 @@
+import logging
+import os
+import time
+import zlib
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Per-target health states
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+DOWN = "down"
+RECOVERING = "recovering"
+
+# Alert events returned by TargetState.record
+ALERT_DOWN = "down"
+ALERT_STILL_DOWN = "still_down"
+ALERT_RECOVERED = "recovered"
+
+# Consecutive failures before a target is declared down and alerted on
+ALERT_FAILURE_THRESHOLD = int(os.getenv("ALERT_FAILURE_THRESHOLD", "2"))
+# Consecutive successes before a down target is declared healthy again
+ALERT_RECOVERY_THRESHOLD = int(os.getenv("ALERT_RECOVERY_THRESHOLD", "2"))
+# Minimum time between repeated alerts for a target that stays down
+ALERT_SUPPRESS_MINUTES = int(os.getenv("ALERT_SUPPRESS_MINUTES", "15"))
+
+
+class TargetState:
+    """Health state, backoff and alert suppression for one monitored target."""
+
+    def __init__(self, name, interval):
+        self.name = name
+        self.interval = interval
+        self.state = HEALTHY
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+        self.next_check_at = 0.0
+        self.last_alert_at = None
+        self.down_since = None
+
+    def is_due(self, now=None):
+        now = time.monotonic() if now is None else now
+        # Allow a second of slack so loop jitter does not skip a whole interval
+        return now >= self.next_check_at - 1.0
+
+    def _backoff(self):
+        # Double the probe interval for every failure past the threshold, capped
+        # at the suppression window so a dead target is still polled regularly
+        extra = max(self.consecutive_failures - ALERT_FAILURE_THRESHOLD, 0)
+        return min(self.interval * (2 ** extra), ALERT_SUPPRESS_MINUTES * 60)
+
+    def record(self, ok, now=None):
+        """Apply one probe outcome and return the alert event to send, if any."""
+        now = time.monotonic() if now is None else now
+        event = None
+        if ok:
+            self.consecutive_failures = 0
+            self.consecutive_successes += 1
+            if self.state in (DOWN, RECOVERING):
+                if self.consecutive_successes >= ALERT_RECOVERY_THRESHOLD:
+                    self.state = HEALTHY
+                    self.down_since = None
+                    self.last_alert_at = None
+                    event = ALERT_RECOVERED
+                else:
+                    self.state = RECOVERING
+            else:
+                self.state = HEALTHY
+            self.next_check_at = now + self.interval
+        else:
+            self.consecutive_successes = 0
+            self.consecutive_failures += 1
+            if self.state == RECOVERING:
+                # Relapse during recovery: still down, stay quiet until the window passes
+                self.state = DOWN
+            if self.state == DOWN:
+                if now - self.last_alert_at >= ALERT_SUPPRESS_MINUTES * 60:
+                    self.last_alert_at = now
+                    event = ALERT_STILL_DOWN
+            elif self.consecutive_failures >= ALERT_FAILURE_THRESHOLD:
+                self.state = DOWN
+                self.down_since = now
+                self.last_alert_at = now
+                event = ALERT_DOWN
+            else:
+                self.state = DEGRADED
+            self.next_check_at = now + (self._backoff() if self.state == DOWN else self.interval)
+        if event:
+            logging.info(f"{self.name}: {self.state} ({event})")
+        return event
+
+
+_states = {}
+
+
+def get_target_state(name, interval, now=None):
+    """Return the state for name, creating it with a stable phase inside the interval.
+
+    The phase spreads first probes evenly instead of bursting them at one tick.
+    """
+    state = _states.get(name)
+    if state is None:
+        now = time.monotonic() if now is None else now
+        state = _states[name] = TargetState(name, interval)
+        state.next_check_at = now + zlib.crc32(name.encode()) % max(int(interval), 1)
+    state.interval = interval
+    return state
+
+
+def get_target_states():
+    """Return a snapshot of every tracked target's state, keyed by name."""
+    return dict(_states)
+
+
+def prune_target_states(names):
+    """Forget targets that are no longer configured."""
+    for name in [name for name in _states if name not in names]:
+        del _states[name]
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from dotenv import load_dotenv
+from update_store import (
+    render_local_excel, get_export_partitions, get_exported_fingerprint, set_exported_fingerprint, LOCAL_EXCEL_FILE,
+)
+from bot_metrics import BACKUP_STAGE_SECONDS
+from cluster import cluster, CLUSTER_HEARTBEAT_SECONDS
+load_dotenv()
+
+BACKUP_WORKERS = int(os.getenv("BACKUP_WORKERS", "2"))
+# "month" uploads one TeamUpdates-YYYY-MM.xlsx per month instead of a single TeamUpdates.xlsx
+UPDATE_EXPORT_PARTITION = os.getenv("UPDATE_EXPORT_PARTITION", "none").lower()
+
+# Blocking Google/xlsx work runs here so the Discord event loop stays responsive
+_executor = ThreadPoolExecutor(max_workers=BACKUP_WORKERS, thread_name_prefix="backup")
+_lock = asyncio.Lock()
+
+current_run = None
+last_run = None
+
+STAGE_ICONS = {"pending": "▫️", "running": "⏳", "done": "✅", "failed": "❌", "skipped": "⏭️"}
+
+
+class BackupInProgress(Exception):
+    pass
+
+
+class BackupRun:
+    """Progress and per-stage timing of one backup pipeline run."""
+
+    def __init__(self, trigger, stage_names):
+        self.trigger = trigger
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self.stages = [{"name": name, "status": "pending", "duration": None} for name in stage_names]
+        self.backup_filename = None
+        self.pushed = 0
+        self.pruned = 0
+        self.uploaded = 0
+        self.error = None
+
+    def summary(self):
+        lines = [f"**Backup ({self.trigger})** started {self.started_at.strftime('%Y-%m-%d %H:%M:%S')}"]
+        for stage in self.stages:
+            line = f"{STAGE_ICONS[stage['status']]} {stage['name']}"
+            if stage["duration"] is not None:
+                line += f" — {stage['duration']:.1f}s"
+            lines.append(line)
+        if self.finished_at:
+            total = (self.finished_at - self.started_at).total_seconds()
+            lines.append(f"Pushed {self.pushed} updates, uploaded {self.uploaded} workbooks, pruned {self.pruned} old backups")
+            lines.append(f"Total: {total:.1f}s" + (f" (failed: {self.error})" if self.error else ""))
+        return "\n".join(lines)
+
+
+def _upload_local_updates():
+    """Render and upload every workbook partition that changed since its last upload.
+
+    Returns the number of workbooks uploaded; unchanged partitions are neither
+    rendered nor uploaded.
+    """
+    from sheets_utils import upload_file_to_other_folder, XLSX_MIME_TYPE
+    by_month = UPDATE_EXPORT_PARTITION == "month"
+    uploaded = 0
+    for partition, fingerprint in get_export_partitions(by_month).items():
+        if get_exported_fingerprint(partition) == fingerprint:
+            continue
+        if not by_month:
+            # The full workbook is also kept locally, as before
+            render_local_excel(LOCAL_EXCEL_FILE)
+            upload_file_to_other_folder(LOCAL_EXCEL_FILE, filename='TeamUpdates.xlsx', mime_type=XLSX_MIME_TYPE)
+        else:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = render_local_excel(os.path.join(tmp_dir, f"{partition}.xlsx"), month=partition)
+                upload_file_to_other_folder(path, filename=f'TeamUpdates-{partition}.xlsx', mime_type=XLSX_MIME_TYPE)
+        set_exported_fingerprint(partition, fingerprint)
+        uploaded += 1
+    return uploaded
+
+
+async def run_backup(trigger, upload_local=False, on_progress=None):
+    """Run push, export, upload and prune in the worker pool; one run at a time.
+
+    Raises BackupInProgress if another run holds the lock, or in cluster mode
+    the "backup" lease, and re-raises the first stage failure after recording
+    it on the run.
+    """
+    if _lock.locked():
+        raise BackupInProgress(current_run.summary() if current_run else "A backup is already running.")
+    async with _lock:
+        # Every instance on the machine shares local_updates.db, so two runs
+        # anywhere in the cluster would push the same unsynced rows twice
+        if not await asyncio.to_thread(cluster.acquire, "backup"):
+            holder = await asyncio.to_thread(cluster.lease_holder, "backup")
+            raise BackupInProgress(f"A backup is already running on instance {holder or 'another instance'}.")
+        renewal = asyncio.create_task(_renew_lease())
+        try:
+            return await _run_stages(trigger, upload_local, on_progress)
+        finally:
+            renewal.cancel()
+            await asyncio.to_thread(cluster.release, "backup")
+
+
+async def _renew_lease():
+    while True:
+        await asyncio.sleep(CLUSTER_HEARTBEAT_SECONDS)
+        try:
+            await asyncio.to_thread(cluster.acquire, "backup")
+        except Exception as e:
+            logging.warning(f"Failed to renew the backup lease: {e}")
+
+
+async def _run_stages(trigger, upload_local, on_progress):
+    global current_run, last_run
+    # Imported on first backup so Google client libraries stay off the startup path
+    from sheets_utils import export_and_backup_spreadsheet, prune_old_backups, push_local_updates_to_gsheets
+    stages = [
+        ("push", push_local_updates_to_gsheets),
+        ("export", lambda: export_and_backup_spreadsheet(prune=False)),
+        ("upload", _upload_local_updates if upload_local else None),
+        ("prune", prune_old_backups),
+    ]
+    run = current_run = BackupRun(trigger, [name for name, _ in stages])
+    loop = asyncio.get_running_loop()
+    try:
+        for stage, (name, func) in zip(run.stages, stages):
+            if func is None:
+                stage["status"] = "skipped"
+                continue
+            stage["status"] = "running"
+            await _report(on_progress, run)
+            start_time = time.monotonic()
+            try:
+                result = await loop.run_in_executor(_executor, func)
+            except Exception as e:
+                stage["status"] = "failed"
+                run.error = e
+                raise
+            else:
+                stage["status"] = "done"
+            finally:
+                stage["duration"] = time.monotonic() - start_time
+                BACKUP_STAGE_SECONDS.labels(name, stage["status"]).observe(stage["duration"])
+            if name == "push":
+                run.pushed = result
+            elif name == "export":
+                run.backup_filename = result
+            elif name == "upload":
+                run.uploaded = result
+            elif name == "prune":
+                run.pruned = result
+        return run
+    finally:
+        run.finished_at = datetime.now()
+        current_run = None
+        last_run = run
+        await _report(on_progress, run)
+
+
+async def _report(on_progress, run):
+    if on_progress is None:
+        return
+    try:
+        await on_progress(run)
+    except Exception as e:
+        logging.warning(f"Backup progress report failed: {e}")
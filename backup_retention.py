@@ -0,0 +1,43 @@
+import os
+from datetime import datetime
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Grandfather-father-son retention: newest backup of each of the last N days, weeks and months
+BACKUP_KEEP_DAILY = int(os.getenv("BACKUP_KEEP_DAILY", "7"))
+BACKUP_KEEP_WEEKLY = int(os.getenv("BACKUP_KEEP_WEEKLY", "4"))
+BACKUP_KEEP_MONTHLY = int(os.getenv("BACKUP_KEEP_MONTHLY", "6"))
+
+
+def parse_created_time(value):
+    """Parse a Drive RFC 3339 createdTime such as 2024-05-01T01:00:03.512Z."""
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def select_expired_backups(files, keep_daily=BACKUP_KEEP_DAILY, keep_weekly=BACKUP_KEEP_WEEKLY, keep_monthly=BACKUP_KEEP_MONTHLY):
+    """Return the Drive files (dicts with createdTime) that no retention rule keeps.
+
+    For each rule the newest backup in each of the N most recent periods that
+    have a backup is kept. The newest backup overall is always kept.
+    """
+    files = sorted(files, key=lambda file: parse_created_time(file["createdTime"]), reverse=True)
+    if not files:
+        return []
+    keep = {files[0]["id"]}
+    rules = [
+        (keep_daily, lambda created: created.date()),
+        (keep_weekly, lambda created: created.isocalendar()[:2]),
+        (keep_monthly, lambda created: (created.year, created.month)),
+    ]
+    for count, period_of in rules:
+        periods = set()
+        for file in files:
+            if len(periods) >= count:
+                break
+            period = period_of(parse_created_time(file["createdTime"]))
+            if period not in periods:
+                # Files are newest first, so the first file seen in a period is its newest
+                periods.add(period)
+                keep.add(file["id"])
+    return [file for file in files if file["id"] not in keep]
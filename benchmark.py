@@ -0,0 +1,315 @@
+"""Offline benchmarks for the monitoring sweep, /update submissions and the backup pipeline.
+
+Everything runs against local stand-ins (see benchmark_fakes.py): a farm of HTTP
+health targets, an in-memory Sheets/Drive backend and fake Discord channels, so
+no token, network or Google account is needed. State lives in a temporary
+directory and never touches the bot's real databases.
+
+    python benchmark.py
+    python benchmark.py --targets 10,100,1000 --concurrency 1,50 --history 1000,20000
+    python benchmark.py --json results.json
+    python benchmark.py --baseline results.json --tolerance 0.25
+
+With --baseline the run exits non-zero when a measurement is slower than the
+baseline by more than the tolerance, so it can gate a deploy.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+
+def parse_args():
+    def int_list(value):
+        return [int(item) for item in value.split(",") if item]
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--only", choices=["sweep", "updates", "backup"], action="append", help="run only these benchmarks (repeatable)")
+    parser.add_argument("--targets", type=int_list, default=[10, 50, 200, 500], help="target counts for the sweep benchmark")
+    parser.add_argument("--sweeps", type=int, default=5, help="sweeps measured per target count")
+    parser.add_argument("--latency-ms", type=float, default=50, help="mean health-target response time")
+    parser.add_argument("--jitter-ms", type=float, default=20, help="standard deviation of the target response time")
+    parser.add_argument("--failure-rate", type=float, default=0.05, help="fraction of probes answered with 503")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="fraction of probes that hang until the probe timeout")
+    parser.add_argument("--probe-timeout", type=float, default=2, help="per-target Timeout written to the generated config")
+    parser.add_argument("--farm-ports", type=int, default=32, help="ports the target farm listens on (each acts as a separate host)")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 10, 50, 200], help="concurrent /update submitters")
+    parser.add_argument("--updates", type=int, default=500, help="updates submitted per concurrency level")
+    parser.add_argument("--history", type=int_list, default=[1000, 5000, 20000], help="total stored updates before each backup")
+    parser.add_argument("--users", type=int, default=20, help="distinct users the update history is spread over")
+    parser.add_argument("--seed-backups", type=int, default=365, help="daily backups already in the fake backup folder")
+    parser.add_argument("--google-latency-ms", type=float, default=30, help="simulated round trip of each Google API request")
+    parser.add_argument("--upload-local", action="store_true", help="run the /backup_now pipeline, including the TeamUpdates.xlsx upload")
+    parser.add_argument("--real-quotas", action="store_true", help="keep the configured Google API rate limits instead of lifting them")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against results written earlier with --json")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--verbose", action="store_true", help="keep the bot's INFO logging")
+    return parser.parse_args()
+
+
+def prepare_environment(args, work_dir):
+    """Point every store at work_dir and give the bot the settings it requires.
+
+    Must run before the bot's modules are imported, since they read the
+    environment at import time.
+    """
+    # Isolation settings always win over .env
+    os.environ.update({
+        "LOCAL_UPDATES_DB": os.path.join(work_dir, "local_updates.db"),
+        "PROBE_DB_FILE": os.path.join(work_dir, "probe_history.db"),
+        "CLUSTER_DB_FILE": os.path.join(work_dir, "cluster.db"),
+        "METADATA_CACHE_FILE": os.path.join(work_dir, "google_metadata_cache.json"),
+        "MONITOR_CONFIG_FILE": os.path.join(work_dir, "config.json"),
+        "CLUSTER_MODE": "false",
+        "METRICS_PORT": "",
+        "SPREADSHEET_ID": "",
+        "GOOGLE_BACKUP_FOLDER_ID": "",
+        "GOOGLE_OTHER_FOLDER_ID": "benchmark-other-folder",
+        "NOTIFY_AFTER_EXPORT": "true",
+    })
+    for key, value in {
+        "DISCORD_BOT_TOKEN": "benchmark",
+        "DISCORD_CHANNEL_ID": "1",
+        "DISCORD_UPDATE_CHANNEL_ID": "2",
+        "DISCORD_MONITOR_CHANNEL_ID": "3",
+        "TIME_INTERVAL": "1",
+        # Post digests straight away so the sweep benchmark can count them
+        "ALERT_DIGEST_DELAY": "0",
+    }.items():
+        os.environ.setdefault(key, value)
+    if not args.real_quotas:
+        for key in ("GOOGLE_SHEETS_RATE", "GOOGLE_SHEETS_BURST", "GOOGLE_DRIVE_RATE", "GOOGLE_DRIVE_BURST"):
+            os.environ[key] = "100000"
+    write_config([])
+
+
+def write_config(servers):
+    path = os.environ["MONITOR_CONFIG_FILE"]
+    with open(path + ".tmp", "w") as file:
+        json.dump(servers, file)
+    os.replace(path + ".tmp", path)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+async def bench_sweep(args, farm, channels):
+    from bot import continuous_monitoring, monitor_config
+    from alert_state import get_target_state, prune_target_states
+    rows = []
+    for count in args.targets:
+        servers = farm.servers(count, timeout=args.probe_timeout)
+        write_config(servers)
+        monitor_config.reload()
+        prune_target_states({server["Name"] for server in servers})
+        durations = []
+        # The first sweep warms the connection pool and is not measured
+        for sweep in range(args.sweeps + 1):
+            now = time.monotonic()
+            for server in servers:
+                get_target_state(server["Name"], server["Interval"] * 60, now).next_check_at = 0
+            start = time.perf_counter()
+            await continuous_monitoring()
+            if sweep:
+                durations.append(time.perf_counter() - start)
+        rows.append({
+            "targets": count,
+            "p50_s": statistics.median(durations),
+            "p95_s": percentile(durations, 0.95),
+            "targets_per_s": count / statistics.median(durations),
+        })
+    alerts = len(channels[int(os.environ["DISCORD_MONITOR_CHANNEL_ID"])].messages)
+    print_table("Monitoring sweep", rows, f"{farm.requests} probes served, {alerts} messages posted to the monitor channel")
+    return rows
+
+
+async def bench_updates(args):
+    from bot import UpdateModal
+    from benchmark_fakes import FakeInteraction
+    rows = []
+    for concurrency in args.concurrency:
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        failures = 0
+
+        async def submit(index):
+            nonlocal failures
+            # on_submit only reads the text input, so the modal itself is not needed
+            modal = SimpleNamespace(update_message=SimpleNamespace(value=f"Benchmark update {index}\nsecond line"))
+            interaction = FakeInteraction(f"user-{index % args.users:03d}")
+            async with semaphore:
+                start = time.perf_counter()
+                await UpdateModal.on_submit(modal, interaction)
+                latencies.append(time.perf_counter() - start)
+            if not interaction.sent or not interaction.sent[-1].startswith("✅"):
+                failures += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(submit(index) for index in range(args.updates)))
+        elapsed = time.perf_counter() - start
+        rows.append({
+            "concurrency": concurrency,
+            "updates_per_s": args.updates / elapsed,
+            "p50_ms": statistics.median(latencies) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "failed": failures,
+        })
+    print_table("/update submissions", rows, f"{args.updates} updates per level")
+    return rows
+
+
+async def bench_backup(args, google):
+    import backup_pipeline
+    from bot import scheduled_backup
+    from backup_pipeline import run_backup
+    from update_store import append_updates_local, get_updates_by_user
+    from datetime import datetime
+    # Updates saved by the /update benchmark count towards the history
+    stored = sum(len(rows) for rows in (await asyncio.to_thread(get_updates_by_user)).values())
+    rows = []
+    for history in args.history:
+        if history > stored:
+            now = datetime.now()
+            await asyncio.to_thread(append_updates_local, [
+                (f"user-{index % args.users:03d}", f"Backfilled update {index}", now)
+                for index in range(stored, history)
+            ])
+            stored = history
+        google.reset_calls()
+        start = time.perf_counter()
+        if args.upload_local:
+            await run_backup("benchmark", upload_local=True)
+        else:
+            await scheduled_backup()
+        elapsed = time.perf_counter() - start
+        run = backup_pipeline.last_run
+        if run is None or run.error:
+            raise RuntimeError(f"Backup at history {history} failed: {run.error if run else 'did not run'}")
+        row = {"history": history, "pushed": run.pushed, "uploaded": run.uploaded, "pruned": run.pruned, "total_s": elapsed}
+        for stage in run.stages:
+            row[f"{stage['name']}_s"] = stage["duration"]
+        row["google_calls"] = sum(google.calls.values())
+        rows.append(row)
+    print_table("Manual backup with upload" if args.upload_local else "Scheduled backup", rows, f"{args.users} users, {args.google_latency_ms:.0f} ms per Google request")
+    return rows
+
+
+def print_table(title, rows, note=""):
+    print(f"\n== {title} ==" + (f" ({note})" if note else ""))
+    if not rows:
+        return
+    columns = list(rows[0])
+    cells = [[_format(row.get(column)) for column in columns] for row in rows]
+    widths = [max(len(column), *(len(line[index]) for line in cells)) for index, column in enumerate(columns)]
+    print("  ".join(column.rjust(width) for column, width in zip(columns, widths)))
+    for line in cells:
+        print("  ".join(cell.rjust(width) for cell, width in zip(line, widths)))
+
+
+def _format(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}" if value < 100 else f"{value:.0f}"
+    return str(value)
+
+
+# Key column and lower-is-better timing columns per benchmark, used for baseline checks
+REGRESSION_CHECKS = {
+    "sweep": ("targets", ["p50_s"]),
+    "updates": ("concurrency", ["p50_ms"]),
+    "backup": ("history", ["total_s"]),
+}
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Return a line for every timing that got slower than baseline by more than tolerance."""
+    regressions = []
+    for name, (key, columns) in REGRESSION_CHECKS.items():
+        previous = {row[key]: row for row in baseline.get(name, [])}
+        for row in results.get(name, []):
+            old = previous.get(row[key])
+            if old is None:
+                continue
+            for column in columns:
+                if old.get(column) and row[column] > old[column] * (1 + tolerance):
+                    regressions.append(f"{name} {key}={row[key]}: {column} {old[column]:.3f} -> {row[column]:.3f}")
+    return regressions
+
+
+async def run(args, channels):
+    from benchmark_fakes import FakeGoogle, TargetFarm, install_fake_google
+    import bot
+    from health_utils import close_session
+    from update_queue import update_writer
+    # Everything the handlers post lands in the fake channels
+    bot.bot.get_channel = channels.get
+    selected = args.only or ["sweep", "updates", "backup"]
+    results = {}
+    if "sweep" in selected:
+        farm = TargetFarm(args.latency_ms, args.jitter_ms, args.failure_rate, args.hang_rate, ports=args.farm_ports)
+        farm.start()
+        try:
+            results["sweep"] = await bench_sweep(args, farm, channels)
+        finally:
+            await close_session()
+            farm.stop()
+    if "updates" in selected:
+        results["updates"] = await bench_updates(args)
+        await update_writer.close()
+    if "backup" in selected:
+        import sheets_utils
+        google = FakeGoogle(latency_ms=args.google_latency_ms)
+        google.seed_backups(sheets_utils.BACKUP_FOLDER_NAME, sheets_utils.SPREADSHEET_NAME, args.seed_backups)
+        install_fake_google(google)
+        results["backup"] = await bench_backup(args, google)
+    await bot.dispatcher.close()
+    return results
+
+
+def main():
+    args = parse_args()
+    args.json = args.json and os.path.abspath(args.json)
+    args.baseline = args.baseline and os.path.abspath(args.baseline)
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bot-benchmark-") as work_dir:
+        prepare_environment(args, work_dir)
+        # Relative paths used by the bot (legacy xlsx import, token) resolve inside work_dir
+        os.chdir(work_dir)
+        try:
+            import bot
+            from benchmark_fakes import FakeChannel
+            if not args.verbose:
+                logging.getLogger().setLevel(logging.WARNING)
+            channels = {
+                channel_id: FakeChannel(channel_id)
+                for channel_id in {bot.CHANNEL_ID, bot.UPDATE_CHANNEL_ID, bot.MONITOR_CHANNEL_ID}
+            }
+            results = asyncio.run(run(args, channels))
+        finally:
+            os.chdir(original_dir)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare_with_baseline(results, json.load(file), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
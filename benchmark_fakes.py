@@ -0,0 +1,516 @@
+"""In-process stand-ins for health targets, the Google Sheets/Drive APIs and Discord.
+
+Used by benchmark.py so the real code paths can be timed without network access.
+"""
+import asyncio
+import json
+import random
+import re
+import socket
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from email.parser import Parser
+from types import SimpleNamespace
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import httplib2
+import requests
+from aiohttp import web
+from requests.structures import CaseInsensitiveDict
+
+SHEETS_MIME_TYPE = "application/vnd.google-apps.spreadsheet"
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+
+
+class TargetFarm:
+    """Local HTTP health targets with configurable latency, failures and hangs.
+
+    The farm runs on its own thread and event loop so serving requests does not
+    compete with the sweep being measured. Targets are spread over several
+    ports because the probe connector limits connections per host.
+    """
+
+    def __init__(self, latency_ms=50, jitter_ms=20, failure_rate=0.0, hang_rate=0.0, hang_seconds=30, ports=16, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.ports = []
+        self.requests = 0
+        self._port_count = ports
+        self._random = random.Random(seed)
+        self._loop = None
+        self._thread = None
+        self._runner = None
+
+    async def _handle(self, request):
+        self.requests += 1
+        draw = self._random.random()
+        delay = max(self._random.gauss(self.latency_ms, self.jitter_ms), 0) / 1000
+        if draw < self.hang_rate:
+            delay = self.hang_seconds
+        await asyncio.sleep(delay)
+        if draw < self.hang_rate + self.failure_rate:
+            return web.Response(status=503, text="unavailable")
+        return web.Response(text="ok")
+
+    async def _serve(self):
+        app = web.Application()
+        app.router.add_get("/health/{target}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        for _ in range(self._port_count):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind(("127.0.0.1", 0))
+            await web.SockSite(self._runner, sock).start()
+            self.ports.append(sock.getsockname()[1])
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="target-farm", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._serve(), self._loop).result()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def servers(self, count, interval=1, timeout=None):
+        """Return config.json entries for count targets."""
+        servers = []
+        for index in range(count):
+            server = {
+                "Name": f"target-{index:04d}",
+                "URL": f"http://127.0.0.1:{self.ports[index % len(self.ports)]}",
+                "Healthcheck Route": f"/health/{index}",
+                "Required Status Code": 200,
+                "Interval": interval,
+            }
+            if timeout is not None:
+                server["Timeout"] = timeout
+            servers.append(server)
+        return servers
+
+
+class FakeGoogle:
+    """In-memory Sheets v4 and Drive v3 backend covering the calls sheets_utils makes.
+
+    handle() takes a raw HTTP request and returns (status, headers, body), so it
+    can sit behind both the requests session used by gspread and the httplib2
+    client used by googleapiclient. Every request sleeps latency_ms to stand in
+    for the network round trip.
+    """
+
+    def __init__(self, latency_ms=50):
+        self.latency_ms = latency_ms
+        self.calls = {}
+        self.files = {}
+        self.spreadsheets = {}
+        self._uploads = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _new_id(self, prefix):
+        self._next_id += 1
+        return f"{prefix}-{self._next_id:06d}"
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls = {}
+
+    def add_file(self, name, mime_type, parents=(), content=b"", created=None):
+        with self._lock:
+            return self._add_file(name, mime_type, parents, content, created)
+
+    def _add_file(self, name, mime_type, parents=(), content=b"", created=None):
+        file_id = self._new_id("file")
+        created = created or datetime.now(timezone.utc)
+        self.files[file_id] = {
+            "id": file_id,
+            "name": name,
+            "mimeType": mime_type,
+            "parents": list(parents),
+            "createdTime": created.strftime("%Y-%m-%dT%H:%M:%S.") + f"{created.microsecond // 1000:03d}Z",
+            "content": content,
+        }
+        if mime_type == SHEETS_MIME_TYPE:
+            self.spreadsheets[file_id] = {"Sheet1": {"sheetId": 0, "rows": []}}
+        return file_id
+
+    def seed_backups(self, folder_name, spreadsheet_name, days):
+        """Create a backup folder holding one backup per day for the last days days."""
+        folder_id = self.add_file(folder_name, FOLDER_MIME_TYPE)
+        now = datetime.now(timezone.utc)
+        for day in range(1, days + 1):
+            created = now - timedelta(days=day)
+            self.add_file(
+                f"{created.strftime('%Y-%m-%d')}_{spreadsheet_name}.xlsx",
+                "application/octet-stream", [folder_id], b"x" * 1024, created,
+            )
+        return folder_id
+
+    def handle(self, method, uri, headers, body):
+        time.sleep(self.latency_ms / 1000)
+        parts = urlsplit(uri)
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        if isinstance(body, str):
+            body = body.encode()
+        with self._lock:
+            operation = f"{method} {re.sub(r'[a-z]+-[0-9]+', '{id}', parts.path)}"
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            if parts.path.startswith("/v4/spreadsheets/"):
+                return self._sheets(method, unquote(parts.path[len("/v4/spreadsheets/"):]), query, body)
+            if parts.path.startswith("/batch/"):
+                return self._batch(headers, body)
+            if parts.path.startswith("/upload/session/"):
+                return self._upload_chunk(parts.path.rsplit("/", 1)[1], headers, body)
+            if parts.path.startswith("/upload/drive/v3/files"):
+                return self._start_upload(method, parts.path[len("/upload/drive/v3/files"):].strip("/"), query, body)
+            if parts.path.startswith("/drive/v3/files"):
+                return self._drive(method, parts.path[len("/drive/v3/files"):].strip("/"), query, headers, body)
+        return _error(404, f"No fake for {method} {parts.path}")
+
+    # Sheets
+
+    def _sheets(self, method, path, query, body):
+        match = re.match(r"([^/:]+)(.*)", path)
+        spreadsheet_id, rest = match.groups()
+        sheets = self.spreadsheets.get(spreadsheet_id)
+        if sheets is None:
+            return _error(404, f"Requested entity was not found: {spreadsheet_id}")
+        payload = json.loads(body) if body else {}
+        if method == "GET" and rest == "":
+            return _json({
+                "spreadsheetId": spreadsheet_id,
+                "properties": {"title": self.files[spreadsheet_id]["name"]},
+                "sheets": [{"properties": self._sheet_properties(title, sheet, index)} for index, (title, sheet) in enumerate(sheets.items())],
+            })
+        if method == "POST" and rest == ":batchUpdate":
+            replies = []
+            for request in payload["requests"]:
+                properties = request["addSheet"]["properties"]
+                if properties["title"] in sheets:
+                    return _error(400, f"A sheet with the name \"{properties['title']}\" already exists.")
+                sheet = sheets[properties["title"]] = {"sheetId": len(sheets) + 1000, "rows": []}
+                replies.append({"addSheet": {"properties": self._sheet_properties(properties["title"], sheet, len(sheets) - 1)}})
+            return _json({"spreadsheetId": spreadsheet_id, "replies": replies})
+        if method == "POST" and rest == "/values:batchUpdate":
+            for data in payload["data"]:
+                title, row, _column = _parse_range(data["range"])
+                rows = sheets[title]["rows"]
+                for offset, values in enumerate(data["values"]):
+                    while len(rows) < row + offset:
+                        rows.append([])
+                    rows[row - 1 + offset] = values
+            return _json({"spreadsheetId": spreadsheet_id})
+        if rest.startswith("/values/"):
+            a1 = rest[len("/values/"):]
+            if method == "POST" and a1.endswith(":append"):
+                title, _row, _column = _parse_range(a1[:-len(":append")])
+                if title not in sheets:
+                    return _error(400, f"Unable to parse range: {a1}")
+                rows = sheets[title]["rows"]
+                start = len(rows) + 1
+                rows.extend(payload["values"])
+                return _json({"spreadsheetId": spreadsheet_id, "updates": {
+                    "updatedRange": f"'{title}'!A{start}", "updatedRows": len(payload["values"]),
+                }})
+            if method == "GET":
+                title, _row, column = _parse_range(a1)
+                if title not in sheets:
+                    return _error(400, f"Unable to parse range: {a1}")
+                rows = sheets[title]["rows"]
+                if query.get("majorDimension") == "COLUMNS":
+                    values = [[row[column] if column < len(row) else "" for row in rows]]
+                else:
+                    values = rows
+                return _json({"range": a1, "majorDimension": query.get("majorDimension", "ROWS"), "values": values})
+        return _error(404, f"No fake for {method} spreadsheets/{path}")
+
+    def _sheet_properties(self, title, sheet, index):
+        return {
+            "sheetId": sheet["sheetId"],
+            "title": title,
+            "index": index,
+            "sheetType": "GRID",
+            "gridProperties": {"rowCount": max(len(sheet["rows"]), 1000), "columnCount": 26},
+        }
+
+    def _export(self, spreadsheet_id):
+        # Stands in for the xlsx export: compressed cell data, so size tracks history
+        sheets = self.spreadsheets[spreadsheet_id]
+        return zlib.compress(json.dumps({title: sheet["rows"] for title, sheet in sheets.items()}).encode())
+
+    # Drive
+
+    def _drive(self, method, path, query, headers, body):
+        if method == "GET" and path == "":
+            return self._list(query)
+        if method == "POST" and path == "":
+            metadata = json.loads(body) if body else {}
+            file_id = self._add_file(metadata["name"], metadata.get("mimeType", "application/octet-stream"), metadata.get("parents", ()))
+            return _json({"id": file_id})
+        file_id, _, action = path.partition("/")
+        file = self.files.get(file_id)
+        if file is None:
+            return _error(404, f"File not found: {file_id}")
+        if method == "DELETE":
+            del self.files[file_id]
+            self.spreadsheets.pop(file_id, None)
+            return 204, {}, b""
+        if method == "GET" and action == "export":
+            return _ranged(self._export(file_id), headers)
+        if method == "GET" and query.get("alt") == "media":
+            return _ranged(file["content"], headers)
+        if method == "GET":
+            return _json(_public(file))
+        return _error(404, f"No fake for {method} files/{path}")
+
+    def _list(self, query):
+        matches = [file for file in self.files.values() if _matches(file, query.get("q", ""))]
+        matches.sort(key=lambda file: file["id"])
+        offset = int(query.get("pageToken") or 0)
+        size = int(query.get("pageSize", 100))
+        page = matches[offset:offset + size]
+        response = {"files": [_public(file) for file in page]}
+        if offset + size < len(matches):
+            response["nextPageToken"] = str(offset + size)
+        return _json(response)
+
+    def _start_upload(self, method, file_id, query, body):
+        if query.get("uploadType") != "resumable":
+            return _error(400, "Only resumable uploads are faked")
+        if file_id and file_id not in self.files:
+            return _error(404, f"File not found: {file_id}")
+        session_id = self._new_id("upload")
+        self._uploads[session_id] = {"file_id": file_id, "metadata": json.loads(body) if body else {}, "data": bytearray()}
+        return 200, {"location": f"https://www.googleapis.com/upload/session/{session_id}"}, b""
+
+    def _upload_chunk(self, session_id, headers, body):
+        upload = self._uploads.get(session_id)
+        if upload is None:
+            return _error(404, "Upload session not found")
+        match = re.match(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)", headers.get("content-range", ""))
+        if match and match.group(1) is not None:
+            upload["data"][int(match.group(1)):] = body or b""
+        total = match.group(3) if match else None
+        if total not in (None, "*") and len(upload["data"]) < int(total):
+            return 308, {"range": f"bytes=0-{len(upload['data']) - 1}"}, b""
+        del self._uploads[session_id]
+        if upload["file_id"]:
+            self.files[upload["file_id"]]["content"] = bytes(upload["data"])
+            return _json({"id": upload["file_id"]})
+        metadata = upload["metadata"]
+        file_id = self._add_file(metadata["name"], metadata.get("mimeType", "application/octet-stream"), metadata.get("parents", ()), bytes(upload["data"]))
+        return _json({"id": file_id})
+
+    def _batch(self, headers, body):
+        message = Parser().parsestr(f"Content-Type: {headers['content-type']}\r\n\r\n" + body.decode())
+        boundary = "fake_batch_boundary"
+        parts = []
+        for part in message.get_payload():
+            request_line, _, rest = part.get_payload().partition("\n")
+            method, path, _version = request_line.split(" ")
+            sub_body = rest.split("\r\n\r\n", 1)[1] if "\r\n\r\n" in rest else None
+            path, _, query = path.partition("?")
+            query = {key: values[0] for key, values in parse_qs(query).items()}
+            status, _sub_headers, content = self._drive(method, path[len("/drive/v3/files"):].strip("/"), query, {}, sub_body)
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{part['Content-ID'][1:]}\r\n\r\n"
+                f"HTTP/1.1 {status} Fake\r\nContent-Type: application/json\r\n\r\n{content.decode()}\r\n"
+            )
+        return 200, {"content-type": f"multipart/mixed; boundary={boundary}"}, ("".join(parts) + f"--{boundary}--").encode()
+
+
+def _json(payload, status=200):
+    return status, {"content-type": "application/json"}, json.dumps(payload).encode()
+
+
+def _error(status, message):
+    return _json({"error": {"code": status, "message": message, "status": "FAILED", "errors": [{"reason": "fake", "message": message}]}}, status)
+
+
+def _public(file):
+    return {key: value for key, value in file.items() if key != "content"}
+
+
+def _ranged(content, headers):
+    match = re.match(r"bytes=(\d+)-(\d+)", headers.get("range", ""))
+    if not match:
+        return 200, {"content-length": str(len(content))}, content
+    start, end = int(match.group(1)), min(int(match.group(2)), len(content) - 1)
+    return 206, {"content-range": f"bytes {start}-{end}/{len(content)}"}, content[start:end + 1]
+
+
+def _matches(file, q):
+    for clause in filter(None, (clause.strip() for clause in q.split(" and "))):
+        if clause == "trashed=false":
+            continue
+        if match := re.fullmatch(r"name='(.*)'", clause):
+            ok = file["name"] == match.group(1)
+        elif match := re.fullmatch(r"name contains '(.*)'", clause):
+            ok = match.group(1) in file["name"]
+        elif match := re.fullmatch(r"mimeType='(.*)'", clause):
+            ok = file["mimeType"] == match.group(1)
+        elif match := re.fullmatch(r"'(.*)' in parents", clause):
+            ok = match.group(1) in file["parents"]
+        else:
+            raise ValueError(f"Unsupported Drive query clause: {clause}")
+        if not ok:
+            return False
+    return True
+
+
+def _parse_range(a1):
+    """Split 'Title'!D1:D into (title, first row, zero-based first column)."""
+    if a1.startswith("'"):
+        end = a1.index("'", 1)
+        while a1[end + 1:end + 2] == "'":
+            end = a1.index("'", end + 2)
+        title, cells = a1[1:end].replace("''", "'"), a1[end + 2:]
+    else:
+        title, _, cells = a1.partition("!")
+    match = re.match(r"([A-Z]*)(\d*)", cells)
+    column = 0
+    for letter in match.group(1):
+        column = column * 26 + ord(letter) - ord("A") + 1
+    return title, int(match.group(2) or 1), max(column - 1, 0)
+
+
+class FakeSheetsAdapter(requests.adapters.BaseAdapter):
+    """requests transport adapter that answers gspread's requests from FakeGoogle."""
+
+    def __init__(self, backend):
+        super().__init__()
+        self.backend = backend
+
+    def send(self, request, **kwargs):
+        status, headers, body = self.backend.handle(request.method, request.url, request.headers, request.body)
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = body
+        response.url = request.url
+        response.request = request
+        response.encoding = "utf-8"
+        return response
+
+    def close(self):
+        pass
+
+
+class FakeDriveHttp:
+    """httplib2-style client that answers googleapiclient's requests from FakeGoogle."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        if hasattr(body, "read"):
+            # Resumable uploads of files send a stream slice instead of bytes
+            body = body.read()
+        status, headers, content = self.backend.handle(method, uri, headers, body)
+        return httplib2.Response({"status": str(status), **headers}), content
+
+
+def install_fake_google(backend):
+    """Point sheets_utils at backend, keeping its instrumentation and rate limiting."""
+    import sheets_utils
+    from google.auth.credentials import AnonymousCredentials
+    from googleapiclient.discovery import build
+    from bot_metrics import instrument_httplib2
+    from google_client import rate_limit_http
+    sheets_utils._creds = AnonymousCredentials()
+    sheets_utils.get_gspread_client().http_client.session.mount("https://", FakeSheetsAdapter(backend))
+    http = rate_limit_http(instrument_httplib2(FakeDriveHttp(backend), "drive"), "drive")
+    sheets_utils._drive_service = build("drive", "v3", http=http, cache_discovery=False, static_discovery=True)
+
+
+class FakeDiscordError(Exception):
+    """Stands in for the HTTP 400 Discord returns for an oversized message."""
+
+
+def check_message(content=None, embed=None, embeds=None, **kwargs):
+    """Reject payloads Discord would reject, so the benchmark catches oversized messages."""
+    embeds = list(embeds or []) + ([embed] if embed is not None else [])
+    problems = []
+    if content is not None and len(content) > 2000:
+        problems.append(f"content is {len(content)} characters (max 2000)")
+    if len(embeds) > 10:
+        problems.append(f"{len(embeds)} embeds (max 10)")
+    for embed in embeds:
+        if embed.title and len(embed.title) > 256:
+            problems.append(f"embed title is {len(embed.title)} characters (max 256)")
+        if embed.description and len(embed.description) > 4096:
+            problems.append(f"embed description is {len(embed.description)} characters (max 4096)")
+        if len(embed.fields) > 25:
+            problems.append(f"{len(embed.fields)} embed fields (max 25)")
+        for field in embed.fields:
+            if len(field.name) > 256 or len(field.value) > 1024:
+                problems.append(f"embed field {field.name[:20]!r} exceeds 256/1024 characters")
+        if embed.footer.text and len(embed.footer.text) > 2048:
+            problems.append(f"embed footer is {len(embed.footer.text)} characters (max 2048)")
+    total = sum(len(embed) for embed in embeds)
+    if total > 6000:
+        problems.append(f"embeds total {total} characters (max 6000)")
+    if problems:
+        raise FakeDiscordError("400 Bad Request: " + "; ".join(problems))
+
+
+class FakeMessage:
+    def __init__(self, channel, content=None, **kwargs):
+        self.channel = channel
+        self.content = content
+        self.author = None
+        self.kwargs = kwargs
+        self.edits = 0
+
+    async def edit(self, content=None, **kwargs):
+        check_message(content, **kwargs)
+        self.content = content
+        self.kwargs = kwargs
+        self.edits += 1
+
+    async def pin(self):
+        self.channel.pinned.append(self)
+
+
+class FakeChannel:
+    """Text channel that records what the bot posts."""
+
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.messages = []
+        self.pinned = []
+
+    async def send(self, content=None, **kwargs):
+        check_message(content, **kwargs)
+        message = FakeMessage(self, content, **kwargs)
+        self.messages.append(message)
+        return message
+
+    async def pins(self):
+        return list(self.pinned)
+
+
+class FakeInteraction:
+    """Just enough of discord.Interaction for deferred slash-command handlers."""
+
+    def __init__(self, display_name):
+        self.user = SimpleNamespace(display_name=display_name)
+        self.sent = []
+        self.response = SimpleNamespace(defer=self._defer, send_message=self._send)
+        self.followup = SimpleNamespace(send=self._send)
+
+    async def _defer(self, **kwargs):
+        pass
+
+    async def _send(self, content=None, **kwargs):
+        check_message(content, **kwargs)
+        self.sent.append(content)
@@ -1,20 +1,29 @@
+import time
+# Taken before the remaining imports so the startup metric includes import time
+STARTED_AT = time.monotonic()
 import discord
 from discord.ext import tasks
 from discord import app_commands
-import requests
 import os
 import logging
-import json
 from dotenv import load_dotenv
-from enum import Enum
-import time
 import apscheduler.schedulers.asyncio
-from sheets_utils import append_update, export_and_backup_spreadsheet, push_local_updates_to_gsheets, upload_file_to_other_folder
+import backup_pipeline
+from backup_pipeline import run_backup, BackupInProgress
+from health_utils import check_server, check_servers, close_session, is_healthy
+from alert_state import get_target_state, get_target_states, prune_target_states
+from monitor_config import monitor_config
+from cluster import cluster, CLUSTER_HEARTBEAT_SECONDS
+from bot_metrics import start_metrics_server, monitor_event_loop_lag, MONITOR_SWEEP_SECONDS, MONITOR_SWEEP_TARGETS, STARTUP_SECONDS
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
-import pandas as pd
-from openpyxl import load_workbook
+from update_queue import update_writer, UpdateQueueFull
+from probe_store import record_probes, get_stats, render_latency_chart, maintain as maintain_probe_store
+from discord_dispatch import AlertDigest, Dispatcher, StatusBoard, describe_timings, render_result_pages, render_status_embeds, render_update_pages, send_paginated
+from update_store import count_updates, export_updates_csv, get_usernames, query_updates
+import tempfile
 import asyncio
+from datetime import datetime
 from discord import ui, Interaction
 import traceback
 load_dotenv()
@@ -25,15 +34,14 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Load environment variables
 TOKEN = os.getenv("DISCORD_BOT_TOKEN")
 CHANNEL_ID = int(os.getenv("DISCORD_CHANNEL_ID"))
-TIME_INTERVAL = int(os.getenv("TIME_INTERVAL"))
-SLEEP_MINUTES = 15
-WAIT_TIME = SLEEP_MINUTES * 60
-# Load server configurations
-with open("./config.json", "r") as file:
-    SERVERS = json.load(file)
+# Scheduler tick; each target is probed on its own interval from config.json
+MONITOR_TICK_SECONDS = int(os.getenv("MONITOR_TICK_SECONDS", "5"))
+CONFIG_RELOAD_SECONDS = int(os.getenv("CONFIG_RELOAD_SECONDS", "30"))
 GUILD_ID = os.getenv("DISCORD_GUILD_ID")
 UPDATE_CHANNEL_ID = int(os.getenv("DISCORD_UPDATE_CHANNEL_ID"))
 MONITOR_CHANNEL_ID = int(os.getenv("DISCORD_MONITOR_CHANNEL_ID"))
+# Query results larger than this are sent as a CSV file instead of embed pages
+UPDATE_QUERY_MAX_PAGED = int(os.getenv("UPDATE_QUERY_MAX_PAGED", "200"))
 # Monitoring flag
 DISABLE_MONITORING = os.getenv("DISABLE_MONITORING", "true").lower() == "true"
 
@@ -48,130 +56,191 @@ class MonitoringBot(discord.Client):
     def __init__(self):
         super().__init__(intents=intents)
         self.tree = app_commands.CommandTree(self)
+        self.ready_after = None
 
     async def setup_hook(self):
         await self.tree.sync()
+        try:
+            self.metrics_runner = await start_metrics_server()
+        except OSError as e:
+            self.metrics_runner = None
+            logging.error(f"Metrics endpoint disabled: {e}")
+        self.loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
+
+    async def close(self):
+        if getattr(self, "loop_lag_task", None):
+            self.loop_lag_task.cancel()
+        if getattr(self, "metrics_runner", None):
+            await self.metrics_runner.cleanup()
+        await update_writer.close()
+        await dispatcher.close()
+        await close_session()
+        await asyncio.to_thread(cluster.leave)
+        await super().close()
 
 
-# Dynamically create the Enum for application names
-ApplicationName = Enum(
-    "ApplicationName",
-    {server["Name"]: server["Name"] for server in SERVERS}
-)
-
 # Initialize the bot
 bot = MonitoringBot()
+# Everything the bot posts on its own goes through one rate-aware queue per channel
+dispatcher = Dispatcher()
+alert_digest = AlertDigest(dispatcher)
+# INSTANCE_ID is stable in cluster mode, so a restarted instance adopts its own pinned board
+status_board = StatusBoard(
+    dispatcher,
+    f"📌 **Application status** ({cluster.instance_id})" if cluster.enabled else "📌 **Application status**",
+)
+
+
+# Application names come from the live config, so new targets need no command re-sync
+async def application_name_autocomplete(interaction: discord.Interaction, current: str):
+    current = current.lower()
+    return [
+        app_commands.Choice(name=name, value=name)
+        for name in monitor_config.by_name
+        if current in name.lower()
+    ][:25]
 
 
 # Slash command to check a specific application's health
 @bot.tree.command(name="check_single_application_health", description="Check health status of a specific application.")
 @app_commands.describe(application_name="Name of the application to check")
-async def check_single_application_health(interaction: discord.Interaction, application_name: ApplicationName):
+@app_commands.autocomplete(application_name=application_name_autocomplete)
+async def check_single_application_health(interaction: discord.Interaction, application_name: str):
     formatter = "----------------------------------------------"
     await interaction.response.defer()
 
-    # Get the application from SERVERS
-    application = next((app for app in SERVERS if app["Name"] == application_name.value), None)
+    # Get the application from the monitoring config
+    application = monitor_config.by_name.get(application_name)
 
     if not application:
-        await interaction.followup.send(f"❌ Application with name '{application_name.value}' not found in the configuration.")
+        await interaction.followup.send(f"❌ Application with name '{application_name}' not found in the configuration.")
         return
 
-    try:
-        healthcheck_endpoint = application["URL"] + application["Healthcheck Route"]
-        response = requests.get(healthcheck_endpoint, timeout=10)
-
-        if response.status_code == 200:
-            response_message = (
-                f"{formatter}\n**Application Name:** {application['Name']}\n✅ Server is healthy.\n{formatter}"
-            )
-        else:
-            response_message = (
-                f"{formatter}\n❌ Server health issue!\n**Application Name:** {application['Name']}\n"
-                f"**Status Code:** {response.status_code}\n{formatter}"
-            )
-    except requests.exceptions.Timeout:
+    result = await check_server(application)
+    await record_results([result])
+    if result["slow"]:
+        response_message = (
+            f"{formatter}\n**Application Name:** {application['Name']}\n🐢 Server is up but slower than its latency SLO: "
+            f"{result['response_time'] * 1000:.0f} ms > {application['Latency SLO']} ms\n{formatter}"
+        )
+    elif result["ok"]:
+        response_message = (
+            f"{formatter}\n**Application Name:** {application['Name']}\n✅ Server is healthy.\n{formatter}"
+        )
+    elif result["timed_out"]:
         response_message = (
             f"{formatter}\n❌ Server health check timed out!\n**Application Name:** {application['Name']}\n{formatter}"
         )
-    except Exception as e:
-        logging.exception("Error during specific application health check")
+    elif result["error"] is not None:
+        response_message = (
+            f"{formatter}\n❌ Error checking server health: {result['error']}\n**Application Name:** {application['Name']}\n{formatter}"
+        )
+    elif result["assertion"] is not None:
+        response_message = (
+            f"{formatter}\n❌ Server response check failed: {result['assertion']}\n**Application Name:** {application['Name']}\n"
+            f"**Status Code:** {result['status_code']}\n{formatter}"
+        )
+    else:
         response_message = (
-            f"{formatter}\n❌ Error checking server health: {e}\n**Application Name:** {application['Name']}\n{formatter}"
+            f"{formatter}\n❌ Server health issue!\n**Application Name:** {application['Name']}\n"
+            f"**Status Code:** {result['status_code']}\n{formatter}"
         )
+    timings = describe_timings(result)
+    if timings:
+        response_message += f"\n**Timings:** {timings}"
 
     await interaction.followup.send(response_message)
 
 
-# Slash command to check all applications' health
-@bot.tree.command(name="check_applications_health", description="Check health status of all configured applications.")
-async def check_applications_health(interaction: discord.Interaction):
-    formatter = "----------------------------------------------"
+STATS_WINDOWS = {"1h": 3600, "24h": 24 * 3600, "7d": 7 * 24 * 3600}
+
+
+async def record_results(results):
+    """Persist probe results to the latency history without blocking the event loop."""
+    try:
+        await asyncio.to_thread(record_probes, results)
+    except Exception as e:
+        logging.error(f"Failed to record probe results: {e}")
+
+
+async def maintain_probe_history():
+    if not cluster.is_leader:
+        return
+    try:
+        await asyncio.to_thread(maintain_probe_store)
+    except Exception as e:
+        logging.error(f"Probe history maintenance failed: {e}")
+
+
+def format_ms(value):
+    return "n/a" if value is None else f"{value:.0f} ms"
+
+
+@bot.tree.command(name="latency", description="Show p50/p95/p99 latency of an application over 1h, 24h and 7d.")
+@app_commands.describe(application_name="Name of the application")
+@app_commands.autocomplete(application_name=application_name_autocomplete)
+async def latency(interaction: discord.Interaction, application_name: str):
     await interaction.response.defer()
-    response_message = ""
+    lines = [f"**Application Name:** {application_name}"]
+    for label, seconds in STATS_WINDOWS.items():
+        stats = await asyncio.to_thread(get_stats, application_name, seconds)
+        if not stats["count"]:
+            lines.append(f"**{label}:** no data")
+            continue
+        lines.append(
+            f"**{label}:** p50 {format_ms(stats['p50'])} · p95 {format_ms(stats['p95'])} · "
+            f"p99 {format_ms(stats['p99'])} ({stats['count']} probes)"
+        )
+    await interaction.followup.send("\n".join(lines))
 
-    for each in SERVERS:
-        try:
-            healthcheck_endpoint = each["URL"] + each["Healthcheck Route"]
-            response = requests.get(healthcheck_endpoint, timeout=10)
-
-            if response.status_code == 200:
-                response_message += f"{formatter}\n**Application Name:** {each['Name']}\n✅ Server is healthy.\n{formatter}\n"
-            else:
-                response_message += f"{formatter}\n❌ Server health issue!\n**Application Name:** {each['Name']}\n**Status Code:** {response.status_code}\n{formatter}\n"
-        except requests.exceptions.Timeout:
-            response_message += f"{formatter}\n❌ Server health check timed out!\n**Application Name:** {each['Name']}\n{formatter}\n"
-        except Exception as e:
-            logging.exception("Error during server health check")
-            response_message += f"{formatter}\n❌ Error checking server health: {e}\n**Application Name:** {each['Name']}\n{formatter}\n"
 
-    await interaction.followup.send(response_message)
+@bot.tree.command(name="uptime", description="Show uptime percentage of an application over 1h, 24h and 7d.")
+@app_commands.describe(application_name="Name of the application")
+@app_commands.autocomplete(application_name=application_name_autocomplete)
+async def uptime(interaction: discord.Interaction, application_name: str):
+    await interaction.response.defer()
+    lines = [f"**Application Name:** {application_name}"]
+    for label, seconds in STATS_WINDOWS.items():
+        stats = await asyncio.to_thread(get_stats, application_name, seconds)
+        if not stats["count"]:
+            lines.append(f"**{label}:** no data")
+        else:
+            lines.append(f"**{label}:** {stats['uptime']:.2f}% ({stats['count']} probes)")
+    await interaction.followup.send("\n".join(lines))
 
 
-# Helper to append update to local Excel file
-def append_update_local(username, update_text):
-    from datetime import datetime
-    import os
-    now = datetime.now()
-    row = {
-        'Date': now.strftime('%Y-%m-%d'),
-        'Time': now.strftime('%H:%M:%S'),
-        'Update Text': update_text
-    }
-    file_exists = os.path.exists('local_updates.xlsx')
-    if file_exists:
+@bot.tree.command(name="latency_chart", description="Plot the latency history of an application.")
+@app_commands.describe(application_name="Name of the application", window="Time window to plot")
+@app_commands.choices(window=[app_commands.Choice(name=label, value=label) for label in STATS_WINDOWS])
+@app_commands.autocomplete(application_name=application_name_autocomplete)
+async def latency_chart(interaction: discord.Interaction, application_name: str, window: str = "24h"):
+    await interaction.response.defer()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "latency.png")
         try:
-            df = pd.read_excel('local_updates.xlsx', sheet_name=username)
-            df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-        except ValueError:
-            # Sheet does not exist
-            df = pd.DataFrame([row])
-        with pd.ExcelWriter('local_updates.xlsx', engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
-            df.to_excel(writer, sheet_name=username, index=False)
-        # Set column widths
-        from openpyxl import load_workbook
-        from openpyxl.utils import get_column_letter
-        wb = load_workbook('local_updates.xlsx')
-        ws = wb[username]
-        for i, col in enumerate(ws.columns, 1):
-            max_length =40 
-            col_letter = get_column_letter(i)
-            ws.column_dimensions[col_letter].width = max_length
-        wb.save('local_updates.xlsx')
-    else:
-        df = pd.DataFrame([row])
-        with pd.ExcelWriter('local_updates.xlsx', engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name=username, index=False)
-        # Set column widths
-        from openpyxl import load_workbook
-        from openpyxl.utils import get_column_letter
-        wb = load_workbook('local_updates.xlsx')
-        ws = wb[username]
-        for i, col in enumerate(ws.columns, 1):
-            max_length = 40
-            col_letter = get_column_letter(i)
-            ws.column_dimensions[col_letter].width = max_length
-        wb.save('local_updates.xlsx')
+            await asyncio.to_thread(render_latency_chart, application_name, STATS_WINDOWS[window], path)
+        except ImportError:
+            await interaction.followup.send("❌ Charts need matplotlib installed.")
+            return
+        await interaction.followup.send(
+            f"**{application_name}** latency over the last {window}",
+            file=discord.File(path, filename="latency.png"),
+        )
+
+
+# Slash command to check all applications' health
+@bot.tree.command(name="check_applications_health", description="Check health status of all configured applications.")
+async def check_applications_health(interaction: discord.Interaction):
+    await interaction.response.defer()
+    if not monitor_config.servers:
+        await interaction.followup.send("No applications are configured.")
+        return
+
+    results = await check_servers(monitor_config.servers)
+    await record_results(results)
+    # One embed page per 25 applications keeps any fleet size under Discord's limits
+    await send_paginated(interaction.followup.send, render_result_pages(results, "Application health"))
+
 
 class UpdateModal(ui.Modal, title="Submit an Update"):
     update_message = ui.TextInput(
@@ -186,89 +255,241 @@ class UpdateModal(ui.Modal, title="Submit an Update"):
         # Use display name for saving and echoing
         display_name = interaction.user.display_name
         message = self.update_message.value
-        import asyncio
-        await asyncio.to_thread(append_update_local, display_name, message)
-        await interaction.response.send_message(f"✅ Update from **{display_name}**:\n{message}")
+        # Acknowledge first: with several instances running, only the one that
+        # claims the interaction goes on to save the update
+        await interaction.response.defer(thinking=True)
+        try:
+            await update_writer.submit(display_name, message)
+        except UpdateQueueFull:
+            await interaction.followup.send("⏳ Too many updates are being saved right now, please try again in a moment.")
+            return
+        except Exception as e:
+            # The interaction is already deferred, so the user must be told the update was lost
+            logging.error(f"Failed to save update from {display_name}: {e}")
+            await interaction.followup.send("❌ Failed to save your update, please try again.")
+            return
+        await interaction.followup.send(f"✅ Update from **{display_name}**:\n{message}")
 
-@bot.tree.command(name="update", description="Submit an update to local Excel file (multi-line supported)")
+@bot.tree.command(name="update", description="Submit an update to the local update store (multi-line supported)")
 async def update(interaction: discord.Interaction):
     await interaction.response.send_modal(UpdateModal())
 
-# Scheduled backup task
-async def scheduled_backup():
+
+async def username_autocomplete(interaction: discord.Interaction, current: str):
+    names = await asyncio.to_thread(get_usernames, current)
+    return [app_commands.Choice(name=name, value=name) for name in names[:25]]
+
+
+def parse_date_option(value):
+    """Validate a YYYY-MM-DD command option; returns None for an empty option."""
+    if not value:
+        return None
+    return datetime.strptime(value.strip(), '%Y-%m-%d').strftime('%Y-%m-%d')
+
+
+async def send_update_results(interaction, title, username=None, since=None, until=None, terms=None, newest_first=False):
+    """Answer a deferred interaction with matching updates as embed pages, or as a CSV file when large."""
+    count = await asyncio.to_thread(count_updates, username, since, until, terms)
+    if not count:
+        await interaction.followup.send(f"{title}: no updates found.")
+        return
+    if count <= UPDATE_QUERY_MAX_PAGED:
+        rows = await asyncio.to_thread(query_updates, username, since, until, terms, None, newest_first)
+        await send_paginated(interaction.followup.send, render_update_pages(rows, f"{title} ({count})"))
+        return
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "updates.csv")
+        await asyncio.to_thread(export_updates_csv, path, username, since, until, terms)
+        limit = interaction.guild.filesize_limit if interaction.guild else 10 * 1024 * 1024
+        if os.path.getsize(path) > limit:
+            await interaction.followup.send(f"{title}: {count} updates is too large to attach; narrow the date range.")
+            return
+        await interaction.followup.send(
+            f"{title}: {count} updates, attached as CSV.",
+            file=discord.File(path, filename="updates.csv"),
+        )
+
+
+@bot.tree.command(name="updates", description="Show a user's updates, optionally within a date range.")
+@app_commands.describe(user="User whose updates to show", since="First day (YYYY-MM-DD)", until="Last day (YYYY-MM-DD)")
+@app_commands.autocomplete(user=username_autocomplete)
+async def updates(interaction: discord.Interaction, user: str, since: str = None, until: str = None):
+    await interaction.response.defer()
+    try:
+        since, until = parse_date_option(since), parse_date_option(until)
+    except ValueError:
+        await interaction.followup.send("❌ Dates must be in YYYY-MM-DD format.")
+        return
+    title = f"Updates from {user}" + (f" since {since}" if since else "") + (f" until {until}" if until else "")
+    await send_update_results(interaction, title, username=user, since=since, until=until)
+
+
+@bot.tree.command(name="search", description="Search the text of all updates.")
+@app_commands.describe(terms="Words that must all appear in the update", user="Only search this user's updates")
+@app_commands.autocomplete(user=username_autocomplete)
+async def search(interaction: discord.Interaction, terms: str, user: str = None):
+    await interaction.response.defer()
+    if not terms.split():
+        await interaction.followup.send("❌ Enter at least one search term.")
+        return
+    # The terms are echoed in the embed title, which Discord caps at 256 characters
+    shown = terms if len(terms) <= 100 else terms[:99] + "…"
+    await send_update_results(interaction, f"Updates matching \"{shown}\"", username=user, terms=terms, newest_first=True)
+
+
+@bot.tree.command(name="standup", description="Show everyone's updates for one day.")
+@app_commands.describe(date="Day to show (YYYY-MM-DD, default today)")
+async def standup(interaction: discord.Interaction, date: str = None):
+    await interaction.response.defer()
+    try:
+        date = parse_date_option(date) or datetime.now().strftime('%Y-%m-%d')
+    except ValueError:
+        await interaction.followup.send("❌ Dates must be in YYYY-MM-DD format.")
+        return
+    await send_update_results(interaction, f"Standup digest for {date}", since=date, until=date)
+
+async def notify_backup_complete(run):
     notify = os.getenv("NOTIFY_AFTER_EXPORT", "true").lower() == "true"
     notify_channel_id = os.getenv("DISCORD_UPDATE_CHANNEL_ID")
     try:
-        # Push local updates to Google Sheets first
-        push_local_updates_to_gsheets()
-        backup_filename = export_and_backup_spreadsheet()
         if notify and notify_channel_id:
             channel = bot.get_channel(int(notify_channel_id))
             if channel:
-                await channel.send(f"Backup complete: `{backup_filename}` (local updates pushed)")
+                await channel.send(f"Backup complete: `{run.backup_filename}` ({run.pushed} new local updates pushed)\n{run.summary()}")
+    except Exception as e:
+        logging.error(f"Backup notification failed: {e}")
+        traceback.print_exc()
+
+# Scheduled backup task
+async def scheduled_backup():
+    # In cluster mode only the elected leader runs the cron backup
+    if not cluster.is_leader:
+        logging.info("Scheduled backup skipped: this instance is not the leader.")
+        return
+    try:
+        run = await run_backup("scheduled")
+    except BackupInProgress:
+        logging.info("Scheduled backup skipped: another backup is still running.")
+        return
     except Exception as e:
-        logging.error(f"Backup/notification failed: {e}")
+        logging.error(f"Backup failed: {e}")
         traceback.print_exc()
+        return
+    await notify_backup_complete(run)
 
 # Setup APScheduler for cron job
 scheduler = AsyncIOScheduler()
 cron_schedule = os.getenv("CRON_SCHEDULE", "0 1 * * *")
 minute, hour, day, month, day_of_week = cron_schedule.split()
 scheduler.add_job(scheduled_backup, CronTrigger(minute=minute, hour=hour, day=day, month=month, day_of_week=day_of_week))
+# Roll up probe history into hourly histograms and apply retention
+scheduler.add_job(maintain_probe_history, CronTrigger(minute=5))
 
 
 # Background task for continuous monitoring
-@tasks.loop(minutes=TIME_INTERVAL)
+@tasks.loop(seconds=MONITOR_TICK_SECONDS)
 async def continuous_monitoring():
     channel = bot.get_channel(MONITOR_CHANNEL_ID)
     if not channel:
         logging.error(f"Channel with ID {MONITOR_CHANNEL_ID} not found. Skipping monitoring.")
         return
 
-    for each in SERVERS:
-        try:
-            healthcheck_endpoint = each["URL"] + each["Healthcheck Route"]
-            start_time = time.time()
-            response = requests.get(healthcheck_endpoint, timeout=10)
-            response_time = time.time() - start_time
-
-            if response.status_code != 200:
-                print(f"response.status_code: {response.status_code}")
-                await channel.send(
-                    f"{'-' * 40}\n❌ Server health issue!\n**Server Host URL:** {healthcheck_endpoint}\n"
-                    f"**Time Taken:** {response_time:.2f} seconds\n**Status Code:** {response.status_code}\nSleeping for {SLEEP_MINUTES} minutes\n{'-' * 40}\n"
-                )
-                await asyncio.sleep(WAIT_TIME)
-        except requests.exceptions.Timeout:
-            print(f"healthcheck_endpoint: {healthcheck_endpoint}")
-            print(f"requests.exceptions.Timeout: {requests.exceptions.Timeout}")
-            await channel.send(f"{'-' * 40}\n❌ Server health check timed out!\n**Server Host URL:** {healthcheck_endpoint}\nSleeping for {SLEEP_MINUTES} minutes\n{'-' * 40}")
-            await asyncio.sleep(WAIT_TIME)
-        except Exception as e:
-            await channel.send(f"{'-' * 40}\n❌ Error checking server health: {e}\n**Server Host URL:** {healthcheck_endpoint}\nSleeping for {SLEEP_MINUTES} minutes\n{'-' * 40}")
-            await asyncio.sleep(WAIT_TIME)
+    # Probe every target that is due, each with its own state and backoff
+    now = time.monotonic()
+    due = [
+        each for each in monitor_config.servers
+        if cluster.owns(each["Name"]) and get_target_state(each["Name"], each["Interval"] * 60, now).is_due(now)
+    ]
+    if not due:
+        return
+    MONITOR_SWEEP_TARGETS.set(len(due))
+    with MONITOR_SWEEP_SECONDS.time():
+        results = await check_servers(due)
+        await record_results(results)
+    events = []
+    changed = False
+    for result in results:
+        state = get_target_state(result["server"]["Name"], result["server"]["Interval"] * 60, now)
+        previous = state.state
+        # A probe slower than its latency SLO counts as a failure for alerting
+        event = state.record(is_healthy(result), now)
+        changed = changed or state.state != previous
+        if event is not None:
+            events.append((event, result, state))
+    # Alerts raised within ALERT_DIGEST_DELAY of the first pending one share its digest message
+    if events:
+        alert_digest.add(channel, events)
+    if changed or not status_board.has_message(channel):
+        refresh_status_board(channel)
+
+
+def refresh_status_board(channel):
+    """Queue an in-place edit of the pinned status message with every owned target's state."""
+    states = {name: state for name, state in get_target_states().items() if cluster.owns(name)}
+    status_board.update(channel, render_status_embeds(states, "Application status"), bot.user)
+
+# Background task that keeps this instance's cluster membership and leader lease alive
+@tasks.loop(seconds=CLUSTER_HEARTBEAT_SECONDS)
+async def cluster_heartbeat():
+    try:
+        if await asyncio.to_thread(cluster.heartbeat):
+            owned = [server["Name"] for server in monitor_config.servers if cluster.owns(server["Name"])]
+            logging.info(
+                f"Cluster members: {cluster.members}; leader: {cluster.is_leader}; "
+                f"owning {len(owned)}/{len(monitor_config.servers)} applications"
+            )
+    except Exception as e:
+        logging.error(f"Cluster heartbeat failed: {e}")
+
+# Background task that hot-reloads config.json
+@tasks.loop(seconds=CONFIG_RELOAD_SECONDS)
+async def watch_config():
+    monitor_channel = bot.get_channel(MONITOR_CHANNEL_ID)
+    try:
+        servers = monitor_config.reload_if_changed()
+    except Exception as e:
+        logging.error(f"Invalid monitoring config, keeping the current one: {e}")
+        if monitor_channel:
+            dispatcher.send(monitor_channel, content=f"{'-' * 40}\n⚠️ config.json is invalid, keeping the current config: {e}\n{'-' * 40}")
+        return
+    if servers is None:
+        return
+    prune_target_states({server["Name"] for server in servers})
+    logging.info(f"Monitoring config reloaded: {len(servers)} applications")
+    if monitor_channel:
+        dispatcher.send(monitor_channel, content=f"{'-' * 40}\n🔄 Monitoring config reloaded: {len(servers)} applications\n{'-' * 40}")
 
 @bot.tree.command(name="backup_now", description="Manually trigger the backup and upload to Google Drive.")
 async def backup_now(interaction: discord.Interaction):
     await interaction.response.send_message("⏳ Running backup now...", ephemeral=True)
-    async def run_backup():
+    async def on_progress(run):
+        await interaction.edit_original_response(content=f"⏳ Running backup now...\n{run.summary()}")
+    async def run_backup_now():
         try:
-            await scheduled_backup()
-            # Upload local Excel file to the 'other' folder after backup
-            upload_file_to_other_folder(
-                'local_updates.xlsx',
-                filename='TeamUpdates.xlsx',
-                mime_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-            await interaction.followup.send("✅ Backup completed and TeamUpdates.xlsx uploaded to folder!", ephemeral=True)
+            run = await run_backup("manual", upload_local=True, on_progress=on_progress)
+            await notify_backup_complete(run)
+            await interaction.followup.send(f"✅ Backup completed and {run.uploaded} changed workbook(s) uploaded to folder!\n{run.summary()}", ephemeral=True)
+        except BackupInProgress as e:
+            await interaction.followup.send(f"⚠️ A backup is already running:\n{e}", ephemeral=True)
         except Exception as e:
             await interaction.followup.send(f"❌ Backup failed: {e}", ephemeral=True)
-    import asyncio
-    asyncio.create_task(run_backup())
+    asyncio.create_task(run_backup_now())
+
+@bot.tree.command(name="backup_status", description="Show progress and stage timings of the current or last backup.")
+async def backup_status(interaction: discord.Interaction):
+    run = backup_pipeline.current_run or backup_pipeline.last_run
+    if run is None:
+        await interaction.response.send_message("No backup has run since the bot started.", ephemeral=True)
+        return
+    await interaction.response.send_message(run.summary(), ephemeral=True)
 
 @bot.event
 async def on_ready():
     logging.info(f"Bot logged in as {bot.user}")
+    if bot.ready_after is None:
+        bot.ready_after = time.monotonic() - STARTED_AT
+        STARTUP_SECONDS.set(bot.ready_after)
+        logging.info(f"Cold start to on_ready took {bot.ready_after:.2f}s")
     logging.info(f"GUILD_ID from .env: {GUILD_ID}")
     if GUILD_ID:
         try:
@@ -285,8 +506,14 @@ async def on_ready():
     monitor_channel = bot.get_channel(MONITOR_CHANNEL_ID)
     if monitor_channel:
         await monitor_channel.send(f"{'-' * 40}\n✅ Bot is online and monitoring!\n{'-' * 40}")
+    if cluster.enabled and not cluster_heartbeat.is_running():
+        await asyncio.to_thread(cluster.heartbeat)
+        cluster_heartbeat.start()
+    if not watch_config.is_running():
+        watch_config.start()
     if not DISABLE_MONITORING:
-        continuous_monitoring.start()
+        if not continuous_monitoring.is_running():
+            continuous_monitoring.start()
         logging.info("Application monitoring started.")
     else:
         logging.info("Application monitoring is DISABLED by flag.")
@@ -297,5 +524,6 @@ async def on_ready():
 
 
 # Run the bot
-logging.info("Starting the bot...")
-bot.run(TOKEN)
+if __name__ == "__main__":
+    logging.info("Starting the bot...")
+    bot.run(TOKEN)
@@ -0,0 +1,134 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+
+from aiohttp import web
+from dotenv import load_dotenv
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.exposition import choose_encoder
+from cluster import CLUSTER_MODE
+load_dotenv()
+
+# Leave METRICS_PORT empty to disable the /metrics endpoint
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = os.getenv("METRICS_PORT")
+if METRICS_PORT is None:
+    # Instances in one cluster share a machine, so a shared default port would collide
+    if CLUSTER_MODE:
+        raise ValueError("METRICS_PORT must be set to a different port on every instance (or left empty to disable) when CLUSTER_MODE=true")
+    METRICS_PORT = "9108"
+EVENT_LOOP_LAG_INTERVAL = 0.5
+
+PROBE_LATENCY = Histogram(
+    "bot_probe_latency_seconds", "Health-check probe latency.", ["target", "outcome"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+PROBE_PHASE_SECONDS = Histogram(
+    "bot_probe_phase_seconds", "Health-check probe time per phase (dns, connect, ttfb, total).", ["target", "phase"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+MONITOR_SWEEP_SECONDS = Histogram("bot_monitor_sweep_seconds", "Duration of one continuous_monitoring sweep.")
+MONITOR_SWEEP_TARGETS = Gauge("bot_monitor_sweep_targets", "Targets probed in the last monitoring sweep.")
+BACKUP_STAGE_SECONDS = Histogram(
+    "bot_backup_stage_seconds", "Duration of each backup pipeline stage.", ["stage", "status"],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+UPDATE_WRITE_SECONDS = Histogram("bot_update_write_seconds", "Time to durably write one batch of /update submissions.")
+UPDATE_BATCH_SIZE = Histogram("bot_update_batch_size", "Submissions per update write batch.", buckets=(1, 2, 5, 10, 25, 50, 100))
+UPDATE_QUEUE_DEPTH = Gauge("bot_update_queue_depth", "Updates waiting for the writer task.")
+GOOGLE_API_CALLS = Counter("bot_google_api_calls_total", "Google API HTTP requests.", ["api", "operation"])
+GOOGLE_API_ERRORS = Counter("bot_google_api_errors_total", "Google API HTTP requests that failed.", ["api", "operation", "code"])
+STARTUP_SECONDS = Gauge("bot_startup_seconds", "Seconds from process start to the first on_ready.")
+EVENT_LOOP_LAG = Histogram(
+    "bot_event_loop_lag_seconds", "How late the event loop woke a periodic timer.",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+# Name of the outermost instrumented sheets_utils function running in this context
+_google_operation = contextvars.ContextVar("google_operation", default="other")
+
+
+def track_google_operation(func):
+    """Attribute Google API requests made inside func to its name."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _google_operation.get() != "other":
+            return func(*args, **kwargs)
+        token = _google_operation.set(func.__name__)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _google_operation.reset(token)
+    return wrapper
+
+
+def instrument_requests_session(session, api):
+    """Count every request made through a requests session (used by gspread)."""
+    request = session.request
+
+    @functools.wraps(request)
+    def counted_request(method, url, *args, **kwargs):
+        operation = _google_operation.get()
+        GOOGLE_API_CALLS.labels(api, operation).inc()
+        try:
+            response = request(method, url, *args, **kwargs)
+        except Exception as e:
+            GOOGLE_API_ERRORS.labels(api, operation, type(e).__name__).inc()
+            raise
+        if response.status_code >= 400:
+            GOOGLE_API_ERRORS.labels(api, operation, str(response.status_code)).inc()
+        return response
+
+    session.request = counted_request
+    return session
+
+
+def instrument_httplib2(http, api):
+    """Count every request made through an httplib2-style client (used by the Drive API)."""
+    request = http.request
+
+    @functools.wraps(request)
+    def counted_request(uri, *args, **kwargs):
+        operation = _google_operation.get()
+        GOOGLE_API_CALLS.labels(api, operation).inc()
+        try:
+            response, content = request(uri, *args, **kwargs)
+        except Exception as e:
+            GOOGLE_API_ERRORS.labels(api, operation, type(e).__name__).inc()
+            raise
+        if response.status >= 400:
+            GOOGLE_API_ERRORS.labels(api, operation, str(response.status)).inc()
+        return response, content
+
+    http.request = counted_request
+    return http
+
+
+async def monitor_event_loop_lag():
+    """Sample event-loop lag forever; blocking calls on the loop show up as large values."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL)
+        EVENT_LOOP_LAG.observe(max(loop.time() - start - EVENT_LOOP_LAG_INTERVAL, 0))
+
+
+async def _metrics_handler(request):
+    encoder, content_type = choose_encoder(request.headers.get("Accept"))
+    return web.Response(body=encoder(REGISTRY), headers={"Content-Type": content_type})
+
+
+async def start_metrics_server():
+    """Serve /metrics (Prometheus text or OpenMetrics) from the running event loop."""
+    if not METRICS_PORT:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, METRICS_HOST, int(METRICS_PORT)).start()
+    logging.info(f"Metrics available at http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    return runner
+
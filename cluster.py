@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Off by default: a single instance owns every target and is always the leader
+CLUSTER_MODE = os.getenv("CLUSTER_MODE", "false").lower() == "true"
+CLUSTER_DB_FILE = os.getenv("CLUSTER_DB_FILE", "cluster.db")
+# Required in cluster mode and must survive restarts: it keys the instance's status board
+INSTANCE_ID = os.getenv("INSTANCE_ID", "")
+CLUSTER_HEARTBEAT_SECONDS = int(os.getenv("CLUSTER_HEARTBEAT_SECONDS", "10"))
+# A member or leader that misses heartbeats for this long is considered dead
+CLUSTER_MEMBER_TTL = int(os.getenv("CLUSTER_MEMBER_TTL", "30"))
+
+
+@contextmanager
+def _connect():
+    conn = sqlite3.connect(CLUSTER_DB_FILE, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _weight(member, target):
+    return hashlib.sha1(f"{member}|{target}".encode()).digest()
+
+
+class Cluster:
+    """Membership, target sharding and leader lease coordinated through a shared SQLite file.
+
+    Targets are assigned by rendezvous (highest random weight) hashing, so when a
+    member joins or dies only that member's share of targets moves.
+    """
+
+    def __init__(self, instance_id=INSTANCE_ID, enabled=CLUSTER_MODE):
+        if enabled and not instance_id:
+            raise ValueError("INSTANCE_ID must be set to a stable, unique name on every instance when CLUSTER_MODE=true")
+        self.instance_id = instance_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.enabled = enabled
+        self.members = [instance_id]
+        self.is_leader = not enabled
+        if enabled:
+            with _connect() as conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS members (instance_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)")
+                conn.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)")
+
+    def heartbeat(self):
+        """Refresh membership and the leader lease; returns True when either changed."""
+        if not self.enabled:
+            return False
+        now = time.time()
+        with _connect() as conn:
+            conn.execute(
+                "INSERT INTO members (instance_id, last_seen) VALUES (?, ?)"
+                " ON CONFLICT(instance_id) DO UPDATE SET last_seen = excluded.last_seen",
+                (self.instance_id, now),
+            )
+            conn.execute("DELETE FROM members WHERE last_seen < ?", (now - CLUSTER_MEMBER_TTL,))
+            members = sorted(row[0] for row in conn.execute("SELECT instance_id FROM members"))
+            # Take the lease if it is ours or has expired; otherwise leave it alone
+            conn.execute(
+                "INSERT INTO leases (name, holder, expires_at) VALUES ('leader', ?, ?)"
+                " ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at"
+                " WHERE leases.holder = excluded.holder OR leases.expires_at < ?",
+                (self.instance_id, now + CLUSTER_MEMBER_TTL, now),
+            )
+            holder = conn.execute("SELECT holder FROM leases WHERE name = 'leader'").fetchone()[0]
+        is_leader = holder == self.instance_id
+        changed = members != self.members or is_leader != self.is_leader
+        if is_leader != self.is_leader:
+            logging.info(f"Instance {self.instance_id} {'is now' if is_leader else 'is no longer'} the leader")
+        self.members, self.is_leader = members, is_leader
+        return changed
+
+    def leave(self):
+        """Drop out of the cluster and release leadership so failover is immediate."""
+        if not self.enabled:
+            return
+        with _connect() as conn:
+            conn.execute("DELETE FROM members WHERE instance_id = ?", (self.instance_id,))
+            conn.execute("DELETE FROM leases WHERE name = 'leader' AND holder = ?", (self.instance_id,))
+        self.is_leader = False
+
+    def acquire(self, name, ttl=CLUSTER_MEMBER_TTL):
+        """Take or renew the named lease for ttl seconds; returns False if another instance holds it.
+
+        Always succeeds outside cluster mode. A holder that dies without
+        releasing loses the lease once ttl passes.
+        """
+        if not self.enabled:
+            return True
+        now = time.time()
+        with _connect() as conn:
+            conn.execute(
+                "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at"
+                " WHERE leases.holder = excluded.holder OR leases.expires_at < ?",
+                (name, self.instance_id, now + ttl, now),
+            )
+            holder = conn.execute("SELECT holder FROM leases WHERE name = ?", (name,)).fetchone()[0]
+        return holder == self.instance_id
+
+    def release(self, name):
+        if not self.enabled:
+            return
+        with _connect() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, self.instance_id))
+
+    def lease_holder(self, name):
+        """Return the instance holding the named lease, or None if it is free or expired."""
+        if not self.enabled:
+            return None
+        with _connect() as conn:
+            row = conn.execute("SELECT holder FROM leases WHERE name = ? AND expires_at >= ?", (name, time.time())).fetchone()
+        return row[0] if row else None
+
+    def owner(self, target):
+        return max(self.members, key=lambda member: _weight(member, target))
+
+    def owns(self, target):
+        return not self.enabled or self.owner(target) == self.instance_id
+
+
+cluster = Cluster()
@@ -0,0 +1,359 @@
+import asyncio
+import logging
+import os
+
+import discord
+from discord import ui
+from dotenv import load_dotenv
+from alert_state import ALERT_DOWN, ALERT_RECOVERED, DEGRADED, DOWN, HEALTHY, RECOVERING
+load_dotenv()
+
+# Discord allows roughly 5 messages per 5 seconds per channel
+DISCORD_CHANNEL_MIN_INTERVAL = float(os.getenv("DISCORD_CHANNEL_MIN_INTERVAL", "1.1"))
+# Alerts are held this long before the digest is posted, so near-simultaneous ones share it
+ALERT_DIGEST_DELAY = float(os.getenv("ALERT_DIGEST_DELAY", "15"))
+
+# Discord embed limits
+EMBED_MAX_FIELDS = 25
+EMBED_MAX_TITLE = 256
+EMBED_MAX_DESCRIPTION = 4096
+EMBED_MAX_FIELD_VALUE = 1024
+MESSAGE_MAX_EMBEDS = 10
+# Shared by every embed in one message: titles, descriptions, fields and footers
+MESSAGE_MAX_EMBED_CHARS = 6000
+# Room kept for a "Page n/m" footer or an "and n more" field added after filling
+EMBED_RESERVE = 64
+
+STATE_ICONS = {HEALTHY: "🟢", DEGRADED: "🟡", DOWN: "🔴", RECOVERING: "🔵"}
+
+
+def describe_result(result):
+    if result["slow"]:
+        return f"🐢 Slow: {result['response_time'] * 1000:.0f} ms (SLO {result['server']['Latency SLO']} ms)"
+    if result["ok"]:
+        return f"✅ Healthy ({result['response_time']:.2f}s)"
+    if result["timed_out"]:
+        return "❌ Timed out"
+    if result["error"] is not None:
+        return f"❌ Error: {result['error']}"[:EMBED_MAX_FIELD_VALUE]
+    if result["assertion"] is not None:
+        return f"❌ Check failed: {result['assertion']}"[:EMBED_MAX_FIELD_VALUE]
+    return f"❌ Status code {result['status_code']} ({result['response_time']:.2f}s)"
+
+
+def describe_timings(result):
+    """One line with the per-phase timing breakdown of a probe, or None if it never connected."""
+    timings = result["timings"]
+    if not timings:
+        return None
+    phases = [
+        f"{phase} {timings[phase] * 1000:.0f} ms"
+        for phase in ("dns", "connect", "ttfb", "total")
+        if timings.get(phase) is not None
+    ]
+    return " · ".join(phases) + (" (reused connection)" if result["reused"] else "")
+
+
+def _has_room(embed, *texts):
+    return len(embed) + sum(len(text) for text in texts) + EMBED_RESERVE <= MESSAGE_MAX_EMBED_CHARS
+
+
+def render_result_pages(results, title):
+    """Render probe results as embeds of up to 25 fields each, one embed per page.
+
+    A page also ends before its text would pass Discord's per-message limit,
+    so long error messages mean fewer results per page.
+    """
+    healthy = sum(result["ok"] for result in results)
+
+    def new_page():
+        return discord.Embed(
+            title=title,
+            description=f"{healthy}/{len(results)} applications healthy",
+            color=discord.Color.green() if healthy == len(results) else discord.Color.red(),
+        )
+
+    pages = [new_page()]
+    for result in results:
+        name, value = result["server"]["Name"][:256], describe_result(result)
+        if len(pages[-1].fields) == EMBED_MAX_FIELDS or not _has_room(pages[-1], name, value):
+            pages.append(new_page())
+        pages[-1].add_field(name=name, value=value, inline=False)
+    for number, embed in enumerate(pages, 1):
+        embed.set_footer(text=f"Page {number}/{len(pages)}")
+    return pages
+
+
+def render_update_pages(rows, title, per_page=10):
+    """Render (id, username, date, time, text) rows as embeds of up to per_page updates each."""
+    if len(title) > EMBED_MAX_TITLE:
+        title = title[:EMBED_MAX_TITLE - 1] + "…"
+    pages = []
+    description = ""
+    entries = 0
+    for _id, username, date, time_, text in rows:
+        text = text if len(text) <= 1000 else text[:1000] + "…"
+        entry = f"**{username}** · {date} {time_}\n{text}\n\n"
+        if entries == per_page or len(description) + len(entry) > EMBED_MAX_DESCRIPTION:
+            pages.append(discord.Embed(title=title, description=description))
+            description, entries = "", 0
+        description += entry
+        entries += 1
+    pages.append(discord.Embed(title=title, description=description or "No updates found."))
+    for number, embed in enumerate(pages, 1):
+        embed.set_footer(text=f"Page {number}/{len(pages)}")
+    return pages
+
+
+class EmbedPaginator(ui.View):
+    """Previous/next buttons that flip one message through a list of embeds."""
+
+    def __init__(self, pages, timeout=600):
+        super().__init__(timeout=timeout)
+        self.pages = pages
+        self.index = 0
+        self._sync_buttons()
+
+    def _sync_buttons(self):
+        self.previous.disabled = self.index == 0
+        self.next.disabled = self.index == len(self.pages) - 1
+
+    async def _show(self, interaction):
+        self._sync_buttons()
+        await interaction.response.edit_message(embed=self.pages[self.index], view=self)
+
+    @ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous(self, interaction: discord.Interaction, button: ui.Button):
+        self.index = max(self.index - 1, 0)
+        await self._show(interaction)
+
+    @ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next(self, interaction: discord.Interaction, button: ui.Button):
+        self.index = min(self.index + 1, len(self.pages) - 1)
+        await self._show(interaction)
+
+
+async def send_paginated(send, pages):
+    """Send pages through send (e.g. interaction.followup.send) with buttons when needed."""
+    if len(pages) == 1:
+        await send(embed=pages[0])
+    else:
+        await send(embed=pages[0], view=EmbedPaginator(pages))
+
+
+def render_alert_digest(events):
+    """Render a batch of alerts as a single embed.
+
+    events is a list of (event, result, state) tuples from TargetState.record.
+    """
+    down = [item for item in events if item[0] != ALERT_RECOVERED]
+    recovered = [item for item in events if item[0] == ALERT_RECOVERED]
+    if down and recovered:
+        title = f"❌ {len(down)} down, ✅ {len(recovered)} recovered"
+    elif down:
+        title = f"❌ {len(down)} application{'s' if len(down) != 1 else ''} unhealthy"
+    else:
+        title = f"✅ {len(recovered)} application{'s' if len(recovered) != 1 else ''} recovered"
+    embed = discord.Embed(title=title, color=discord.Color.red() if down else discord.Color.green())
+    shown = 0
+    for event, result, state in down + recovered:
+        problem = "slow" if result["slow"] else "down"
+        if event == ALERT_DOWN:
+            label = problem.capitalize()
+        elif event == ALERT_RECOVERED:
+            label = "Recovered"
+        else:
+            label = f"Still {problem} ({int((state.last_alert_at - state.down_since) // 60)} min)"
+        name = f"{result['server']['Name']} · {label}"[:256]
+        value = f"{describe_result(result)}\n{result['endpoint']}"[:EMBED_MAX_FIELD_VALUE]
+        # Keep the last field free for the "and n more" line
+        if len(embed.fields) == EMBED_MAX_FIELDS - 1 or not _has_room(embed, name, value):
+            break
+        embed.add_field(name=name, value=value, inline=False)
+        shown += 1
+    if len(events) > shown:
+        embed.add_field(name="…", value=f"and {len(events) - shown} more", inline=False)
+    return embed
+
+
+def render_status_embeds(states, title):
+    """Render the fleet state for the status board as embeds that fit one message.
+
+    A count per state comes first, then every target that is not healthy, then
+    the healthy ones; targets that do not fit are summarised in the footer.
+    """
+    counts = {}
+    for state in states.values():
+        counts[state.state] = counts.get(state.state, 0) + 1
+    summary = " · ".join(
+        f"{STATE_ICONS.get(name, '⚪')} {count} {name}" for name, count in sorted(counts.items())
+    ) or "No applications configured."
+    ordered = sorted(states.items(), key=lambda item: (item[1].state == HEALTHY, item[0]))
+    lines = [f"{STATE_ICONS.get(state.state, '⚪')} **{name}** — {state.state}" for name, state in ordered]
+    embeds = [discord.Embed(title=title, description=summary + "\n\n")]
+    used = len(embeds[0])
+    shown = 0
+    for line in lines:
+        line += "\n"
+        if used + len(line) + EMBED_RESERVE > MESSAGE_MAX_EMBED_CHARS:
+            break
+        if len(embeds[-1].description) + len(line) > EMBED_MAX_DESCRIPTION:
+            if len(embeds) == MESSAGE_MAX_EMBEDS:
+                break
+            embeds.append(discord.Embed(description=""))
+        embeds[-1].description += line
+        used += len(line)
+        shown += 1
+    if shown < len(lines):
+        hidden = lines[shown:]
+        unhealthy = sum(not line.startswith(STATE_ICONS[HEALTHY]) for line in hidden)
+        embeds[-1].set_footer(
+            text=f"…and {len(hidden)} more ({unhealthy} not healthy)" if unhealthy else f"…and {len(hidden)} more healthy"
+        )
+    return embeds
+
+
+class Dispatcher:
+    """Per-channel outbound queue that spaces messages to stay under Discord rate limits.
+
+    Edits share a key; if an edit for the same key is still queued, only the
+    newest content is sent.
+    """
+
+    def __init__(self, min_interval=DISCORD_CHANNEL_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._queues = {}
+        self._workers = {}
+        self._pending_edits = {}
+
+    def _queue_for(self, channel):
+        queue = self._queues.get(channel.id)
+        if queue is None:
+            queue = self._queues[channel.id] = asyncio.Queue()
+        worker = self._workers.get(channel.id)
+        if worker is None or worker.done():
+            self._workers[channel.id] = asyncio.create_task(self._run(queue))
+        return queue
+
+    def send(self, channel, **kwargs):
+        """Queue channel.send(**kwargs); returns a future resolving to the message."""
+        future = asyncio.get_running_loop().create_future()
+        # Failures are already logged, so callers may ignore the result
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._queue_for(channel).put_nowait((lambda: channel.send(**kwargs), future))
+        return future
+
+    def edit(self, channel, key, make_edit):
+        """Queue the coroutine factory make_edit under key, replacing a queued edit."""
+        queued = key in self._pending_edits
+        self._pending_edits[key] = make_edit
+        if not queued:
+            self._queue_for(channel).put_nowait((key, None))
+
+    async def _run(self, queue):
+        while True:
+            item, future = await queue.get()
+            if not callable(item):
+                item = self._pending_edits.pop(item, None)
+                if item is None:
+                    continue
+            try:
+                result = await item()
+                if future is not None and not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                logging.error(f"Discord dispatch failed: {e}")
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            await asyncio.sleep(self.min_interval)
+
+    async def close(self):
+        for worker in self._workers.values():
+            worker.cancel()
+        self._workers.clear()
+
+
+class AlertDigest:
+    """Groups alerts into one digest message per channel.
+
+    The first alert opens a digest that is posted after delay seconds; alerts
+    raised meanwhile join it. Once it is posted the next alert opens a new
+    digest, since edits to a posted message notify nobody.
+    """
+
+    def __init__(self, dispatcher, delay=ALERT_DIGEST_DELAY):
+        self.dispatcher = dispatcher
+        self.delay = delay
+        self._open = {}
+        self._tasks = set()
+
+    def add(self, channel, events):
+        """Add (event, result, state) tuples to the channel's pending digest, opening one if needed."""
+        pending = self._open.get(channel.id)
+        if pending is not None:
+            pending.extend(events)
+            return
+        pending = self._open[channel.id] = list(events)
+        task = asyncio.create_task(self._post(channel, pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _post(self, channel, pending):
+        await asyncio.sleep(self.delay)
+        del self._open[channel.id]
+        self.dispatcher.send(channel, embed=render_alert_digest(pending))
+
+
+class StatusBoard:
+    """One pinned message per channel that is edited in place with the fleet state.
+
+    update() never waits on Discord: the message is found or created in the
+    background and edits go through the dispatcher queue.
+    """
+
+    def __init__(self, dispatcher, marker):
+        self.dispatcher = dispatcher
+        self.marker = marker
+        self._messages = {}
+        self._latest = {}
+        self._attaching = {}
+
+    def has_message(self, channel):
+        return channel.id in self._messages
+
+    def update(self, channel, embeds, bot_user):
+        self._latest[channel.id] = embeds
+        if channel.id in self._messages:
+            self._queue_edit(channel)
+            return
+        task = self._attaching.get(channel.id)
+        if task is None or task.done():
+            self._attaching[channel.id] = asyncio.create_task(self._attach(channel, bot_user))
+
+    def _queue_edit(self, channel):
+        message = self._messages[channel.id]
+        embeds = self._latest[channel.id]
+        self.dispatcher.edit(channel, ("status", channel.id), lambda: message.edit(content=self.marker, embeds=embeds))
+
+    async def _attach(self, channel, bot_user):
+        """Adopt this bot's pinned status message, or post and pin a new one."""
+        try:
+            message = None
+            for pinned in await channel.pins():
+                if pinned.author == bot_user and pinned.content == self.marker:
+                    message = pinned
+                    break
+            sent = None
+            if message is None:
+                sent = self._latest[channel.id]
+                message = await self.dispatcher.send(channel, content=self.marker, embeds=sent)
+                try:
+                    await message.pin()
+                except discord.HTTPException as e:
+                    logging.warning(f"Could not pin the status message: {e}")
+            self._messages[channel.id] = message
+            # Apply anything that changed while the message was being found or posted
+            if self._latest[channel.id] is not sent:
+                self._queue_edit(channel)
+        except Exception as e:
+            logging.error(f"Failed to set up the status message in channel {channel.id}: {e}")
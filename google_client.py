@@ -0,0 +1,170 @@
+import functools
+import logging
+import os
+import random
+import threading
+import time
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Sustained requests per second and burst size for each API's token bucket
+GOOGLE_SHEETS_RATE = float(os.getenv("GOOGLE_SHEETS_RATE", "1"))
+GOOGLE_SHEETS_BURST = int(os.getenv("GOOGLE_SHEETS_BURST", "5"))
+GOOGLE_DRIVE_RATE = float(os.getenv("GOOGLE_DRIVE_RATE", "5"))
+GOOGLE_DRIVE_BURST = int(os.getenv("GOOGLE_DRIVE_BURST", "10"))
+GOOGLE_API_MAX_RETRIES = int(os.getenv("GOOGLE_API_MAX_RETRIES", "6"))
+GOOGLE_API_BACKOFF_BASE = float(os.getenv("GOOGLE_API_BACKOFF_BASE", "1"))
+GOOGLE_API_BACKOFF_MAX = float(os.getenv("GOOGLE_API_BACKOFF_MAX", "64"))
+# Drive accepts at most 100 calls per batch request
+DRIVE_BATCH_SIZE = 100
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until enough tokens are available."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Take tokens, waiting as long as needed; more than capacity is paid in capacity-sized steps."""
+        while tokens > 0:
+            step = min(tokens, self.capacity)
+            self._acquire(step)
+            tokens -= step
+
+    def _acquire(self, tokens):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+buckets = {
+    "sheets": TokenBucket(GOOGLE_SHEETS_RATE, GOOGLE_SHEETS_BURST),
+    "drive": TokenBucket(GOOGLE_DRIVE_RATE, GOOGLE_DRIVE_BURST),
+}
+
+
+def rate_limit_session(session, api):
+    """Make every request through a requests session (gspread) wait for a token."""
+    request = session.request
+
+    @functools.wraps(request)
+    def limited_request(*args, **kwargs):
+        buckets[api].acquire()
+        return request(*args, **kwargs)
+
+    session.request = limited_request
+    return session
+
+
+def rate_limit_http(http, api):
+    """Make every request through an httplib2-style client (Drive) wait for a token."""
+    request = http.request
+
+    @functools.wraps(request)
+    def limited_request(*args, **kwargs):
+        buckets[api].acquire()
+        return request(*args, **kwargs)
+
+    http.request = limited_request
+    return http
+
+
+def _status_and_reason(error):
+    from googleapiclient.errors import HttpError
+    import gspread
+    if isinstance(error, HttpError):
+        reason = error.error_details[0].get("reason") if error.error_details and isinstance(error.error_details, list) else None
+        return error.resp.status, reason
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.response.status_code, None
+    return None, None
+
+
+def is_rate_limited(error):
+    status, reason = _status_and_reason(error)
+    return status == 429 or (status == 403 and reason in RATE_LIMIT_REASONS)
+
+
+def is_retryable(error):
+    """Rate limits, 5xx responses and dropped connections are worth retrying."""
+    import httplib2
+    if isinstance(error, (OSError, httplib2.HttpLib2Error)):
+        return True
+    status, _reason = _status_and_reason(error)
+    return status in RETRYABLE_STATUS_CODES or is_rate_limited(error)
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(GOOGLE_API_BACKOFF_MAX, GOOGLE_API_BACKOFF_BASE * 2 ** attempt))
+
+
+def call_with_retry(func, *args, idempotent=True, **kwargs):
+    """Call func, retrying retryable errors with backoff.
+
+    Non-idempotent calls (creates, appends) are only retried when the API
+    rejected them for rate limiting, since a 5xx may have been applied.
+    """
+    for attempt in range(GOOGLE_API_MAX_RETRIES + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            retry = is_retryable(e) if idempotent else is_rate_limited(e)
+            if not retry or attempt == GOOGLE_API_MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            logging.warning(f"Google API call {getattr(func, '__name__', func)} failed ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def execute(request, idempotent=True):
+    """Execute a googleapiclient request with retries."""
+    return call_with_retry(request.execute, idempotent=idempotent)
+
+
+def batch_execute(service, requests):
+    """Run idempotent Drive requests as BatchHttpRequests of up to DRIVE_BATCH_SIZE calls.
+
+    Failed sub-requests that are retryable are re-batched with backoff.
+    Returns a list of (response, exception) in the order of requests.
+    """
+    results = [None] * len(requests)
+    pending = list(range(len(requests)))
+    for attempt in range(GOOGLE_API_MAX_RETRIES + 1):
+        retry = []
+        for start in range(0, len(pending), DRIVE_BATCH_SIZE):
+            chunk = pending[start:start + DRIVE_BATCH_SIZE]
+
+            def callback(request_id, response, exception):
+                index = int(request_id)
+                results[index] = (response, exception)
+                if exception is not None and is_retryable(exception):
+                    retry.append(index)
+
+            batch = service.new_batch_http_request(callback=callback)
+            for index in chunk:
+                batch.add(requests[index], request_id=str(index))
+            # Each call in the batch counts against the per-user quota
+            buckets["drive"].acquire(len(chunk))
+            call_with_retry(batch.execute)
+        if not retry or attempt == GOOGLE_API_MAX_RETRIES:
+            break
+        pending = sorted(retry)
+        time.sleep(backoff_delay(attempt))
+    return results
@@ -0,0 +1,244 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+from bot_metrics import PROBE_LATENCY, PROBE_PHASE_SECONDS
+from dotenv import load_dotenv
+load_dotenv()
+
+# Health-check engine settings
+HEALTHCHECK_CONCURRENCY = int(os.getenv("HEALTHCHECK_CONCURRENCY", "20"))
+HEALTHCHECK_LIMIT_PER_HOST = int(os.getenv("HEALTHCHECK_LIMIT_PER_HOST", "4"))
+HEALTHCHECK_TIMEOUT = float(os.getenv("HEALTHCHECK_TIMEOUT", "10"))
+# Idle connections are kept longer than a probe interval so repeat probes skip the handshake
+HEALTHCHECK_KEEPALIVE_SECONDS = float(os.getenv("HEALTHCHECK_KEEPALIVE_SECONDS", "120"))
+HEALTHCHECK_DNS_CACHE_SECONDS = int(os.getenv("HEALTHCHECK_DNS_CACHE_SECONDS", "300"))
+# Response bodies are read up to this size for assertions and so connections can be reused
+HEALTHCHECK_MAX_BODY_BYTES = int(os.getenv("HEALTHCHECK_MAX_BODY_BYTES", str(1024 * 1024)))
+
+_session = None
+_semaphore = None
+
+
+def get_healthcheck_endpoint(server):
+    if server.get("Type") == "tcp":
+        host, port = get_tcp_address(server)
+        return f"tcp://{host}:{port}"
+    return server["URL"] + server["Healthcheck Route"]
+
+
+def get_tcp_address(server):
+    """Return (host, port) of a TCP target whose URL is host:port or tcp://host:port."""
+    parts = urlsplit(server["URL"] if "://" in server["URL"] else "tcp://" + server["URL"])
+    if not parts.hostname or parts.port is None:
+        raise ValueError(f"TCP target URL must be host:port, got {server['URL']!r}")
+    return parts.hostname, parts.port
+
+
+def get_expected_status_codes(server):
+    codes = server.get("Required Status Code", 200)
+    return codes if isinstance(codes, list) else [codes]
+
+
+def _trace_config():
+    """Record per-phase timestamps into the dict passed as trace_request_ctx."""
+    def stamp(key, overwrite=True):
+        async def handler(session, context, params):
+            if overwrite or key not in context.trace_request_ctx:
+                context.trace_request_ctx[key] = time.monotonic()
+        return handler
+
+    async def on_reuse(session, context, params):
+        context.trace_request_ctx["reused"] = True
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(stamp("request_start", overwrite=False))
+    config.on_dns_resolvehost_start.append(stamp("dns_start"))
+    config.on_dns_resolvehost_end.append(stamp("dns_end"))
+    config.on_connection_create_start.append(stamp("connect_start"))
+    config.on_connection_create_end.append(stamp("connect_end"))
+    config.on_connection_reuseconn.append(on_reuse)
+    config.on_request_end.append(stamp("headers"))
+    return config
+
+
+async def get_session():
+    """Return the shared pooled aiohttp session, creating it on first use."""
+    global _session, _semaphore
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HEALTHCHECK_CONCURRENCY,
+            limit_per_host=HEALTHCHECK_LIMIT_PER_HOST,
+            keepalive_timeout=HEALTHCHECK_KEEPALIVE_SECONDS,
+            ttl_dns_cache=HEALTHCHECK_DNS_CACHE_SECONDS,
+        )
+        _session = aiohttp.ClientSession(connector=connector, trace_configs=[_trace_config()])
+        _semaphore = asyncio.Semaphore(HEALTHCHECK_CONCURRENCY)
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def _phase_timings(marks, end):
+    """Turn trace timestamps into phase durations in seconds.
+
+    aiohttp reports TLS as part of connection setup, so connect covers the TCP
+    and TLS handshakes. dns and connect are 0 for a reused connection or a DNS
+    cache hit.
+    """
+    dns = marks["dns_end"] - marks["dns_start"] if "dns_end" in marks else 0.0
+    connect = marks["connect_end"] - marks["connect_start"] - dns if "connect_end" in marks else 0.0
+    sent = marks.get("connect_end", marks.get("request_start", end))
+    return {
+        "dns": dns,
+        "connect": max(connect, 0.0),
+        "ttfb": marks["headers"] - sent if "headers" in marks else None,
+        "total": end - marks.get("request_start", end),
+    }
+
+
+def _json_path(document, path):
+    value = document
+    for key in path.split("."):
+        if isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        elif isinstance(value, dict) and key in value:
+            value = value[key]
+        else:
+            raise KeyError(path)
+    return value
+
+
+def check_assertions(server, body):
+    """Return a description of the first failed body/JSON assertion, or None."""
+    expected_text = server.get("Expect Body")
+    if expected_text is not None and expected_text not in bytes(body).decode("utf-8", errors="replace"):
+        return f"body does not contain {expected_text!r}"
+    expected_json = server.get("Expect JSON")
+    if expected_json:
+        try:
+            document = json.loads(body)
+        except ValueError:
+            return "body is not valid JSON"
+        for path, expected in expected_json.items():
+            try:
+                actual = _json_path(document, path)
+            except KeyError:
+                return f"{path} is missing"
+            if actual != expected:
+                return f"{path} is {actual!r}, expected {expected!r}"
+    return None
+
+
+async def _probe_http(server, result, timeout):
+    session = await get_session()
+    marks = {}
+    async with session.get(result["endpoint"], timeout=timeout, trace_request_ctx=marks) as response:
+        result["status_code"] = response.status
+        # Reading the body lets the connection go back to the pool for the next probe
+        body = bytearray()
+        while len(body) < HEALTHCHECK_MAX_BODY_BYTES:
+            chunk = await response.content.read(HEALTHCHECK_MAX_BODY_BYTES - len(body))
+            if not chunk:
+                break
+            body += chunk
+        result["ok"] = response.status in get_expected_status_codes(server)
+        if result["ok"]:
+            result["assertion"] = check_assertions(server, body)
+            result["ok"] = result["assertion"] is None
+    result["timings"] = _phase_timings(marks, time.monotonic())
+    result["reused"] = marks.get("reused", False)
+
+
+async def _probe_tcp(server, result, timeout):
+    host, port = get_tcp_address(server)
+    loop = asyncio.get_running_loop()
+    async with asyncio.timeout(timeout.total):
+        start = time.monotonic()
+        infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        resolved = time.monotonic()
+        _reader, writer = await asyncio.open_connection(infos[0][4][0], port)
+        connected = time.monotonic()
+        writer.close()
+        await writer.wait_closed()
+    result["ok"] = True
+    result["timings"] = {"dns": resolved - start, "connect": connected - resolved, "ttfb": None, "total": connected - start}
+
+
+async def check_server(server):
+    """Probe a single server and return a result dict; never raises.
+
+    ok is the hard health verdict (status code and assertions); slow is set
+    when a healthy probe exceeds the target's "Latency SLO" in milliseconds.
+    """
+    endpoint = get_healthcheck_endpoint(server)
+    timeout = aiohttp.ClientTimeout(total=float(server.get("Timeout", HEALTHCHECK_TIMEOUT)))
+    result = {
+        "server": server,
+        "endpoint": endpoint,
+        "status_code": None,
+        "response_time": None,
+        "ok": False,
+        "timed_out": False,
+        "error": None,
+        "assertion": None,
+        "slow": False,
+        "timings": None,
+        "reused": False,
+    }
+    await get_session()
+    async with _semaphore:
+        start_time = time.monotonic()
+        try:
+            if server.get("Type") == "tcp":
+                await _probe_tcp(server, result, timeout)
+            else:
+                await _probe_http(server, result, timeout)
+        except asyncio.TimeoutError:
+            result["timed_out"] = True
+        except Exception as e:
+            logging.warning(f"Health check for {server['Name']} failed: {e!r}")
+            result["error"] = e
+        result["response_time"] = time.monotonic() - start_time
+    slo = server.get("Latency SLO")
+    result["slow"] = result["ok"] and slo is not None and result["response_time"] * 1000 > slo
+    PROBE_LATENCY.labels(server["Name"], get_outcome(result)).observe(result["response_time"])
+    for phase, seconds in (result["timings"] or {}).items():
+        if seconds is not None:
+            PROBE_PHASE_SECONDS.labels(server["Name"], phase).observe(seconds)
+    return result
+
+
+def get_outcome(result):
+    if result["slow"]:
+        return "slow"
+    if result["ok"]:
+        return "ok"
+    if result["timed_out"]:
+        return "timeout"
+    if result["error"] is not None:
+        return "error"
+    if result["assertion"] is not None:
+        return "assertion"
+    return "status"
+
+
+def is_healthy(result):
+    """Whether a result counts as healthy for alerting: up and within its latency SLO."""
+    return result["ok"] and not result["slow"]
+
+
+async def check_servers(servers):
+    """Probe all servers concurrently, preserving the input order."""
+    await get_session()
+    return await asyncio.gather(*(check_server(server) for server in servers))
@@ -0,0 +1,62 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+class MetadataCache:
+    """Small TTL cache for Google API metadata, optionally persisted to a JSON file.
+
+    Entries set with ttl=None never expire and are only dropped by invalidate().
+    """
+
+    def __init__(self, path=None, ttl=None):
+        self.path = path
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as file:
+                self._entries = {key: tuple(entry) for key, entry in json.load(file).items()}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable metadata cache {self.path}: {e}")
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self._entries, file)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                self._save()
+                return None
+            return value
+
+    def set(self, key, value, ttl="default"):
+        ttl = self.ttl if ttl == "default" else ttl
+        with self._lock:
+            self._entries[key] = (value, None if ttl is None else time.time() + ttl)
+            self._save()
+
+    def invalidate(self, prefix=""):
+        """Drop every entry whose key starts with prefix (all entries by default)."""
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+            self._save()
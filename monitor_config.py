@@ -0,0 +1,112 @@
+import json
+import logging
+import os
+import threading
+
+from dotenv import load_dotenv
+from health_utils import get_tcp_address
+load_dotenv()
+
+MONITOR_CONFIG_FILE = os.getenv("MONITOR_CONFIG_FILE", "./config.json")
+# Default probe interval in minutes for targets without an "Interval"
+TIME_INTERVAL = int(os.getenv("TIME_INTERVAL"))
+DEFAULT_STATUS_CODE = 200
+PROBE_TYPES = ("http", "tcp")
+
+
+def validate_servers(data):
+    """Validate and normalise config.json entries; raises ValueError on the first problem.
+
+    Optional per-target keys: "Required Status Code" (int or list of ints),
+    "Interval" (minutes), "Timeout" (seconds), "Latency SLO" (milliseconds),
+    "Expect Body" (text the response must contain) and "Expect JSON" (object
+    of dotted paths to expected values). "Type": "tcp" makes the target a plain
+    TCP connect probe whose "URL" is host:port and which needs no
+    "Healthcheck Route".
+    """
+    if not isinstance(data, list):
+        raise ValueError("config must be a JSON list of servers")
+    servers = []
+    names = set()
+    for position, entry in enumerate(data, 1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"entry {position} is not an object")
+        probe_type = entry.get("Type", "http")
+        if probe_type not in PROBE_TYPES:
+            raise ValueError(f"entry {position}: \"Type\" must be one of {', '.join(PROBE_TYPES)}")
+        required = ("Name", "URL") if probe_type == "tcp" else ("Name", "URL", "Healthcheck Route")
+        for key in required:
+            if not isinstance(entry.get(key), str) or not entry[key]:
+                raise ValueError(f"entry {position} is missing \"{key}\"")
+        name = entry["Name"]
+        if name in names:
+            raise ValueError(f"duplicate application name \"{name}\"")
+        names.add(name)
+        codes = entry.get("Required Status Code", DEFAULT_STATUS_CODE)
+        codes = codes if isinstance(codes, list) else [codes]
+        if not codes or not all(isinstance(code, int) for code in codes):
+            raise ValueError(f"\"{name}\": \"Required Status Code\" must be an int or a list of ints")
+        interval = entry.get("Interval", TIME_INTERVAL)
+        for key, value in (("Interval", interval), ("Timeout", entry.get("Timeout")), ("Latency SLO", entry.get("Latency SLO"))):
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+                raise ValueError(f"\"{name}\": \"{key}\" must be a positive number")
+        if "Expect Body" in entry and (not isinstance(entry["Expect Body"], str) or not entry["Expect Body"]):
+            raise ValueError(f"\"{name}\": \"Expect Body\" must be a non-empty string")
+        if "Expect JSON" in entry and (not isinstance(entry["Expect JSON"], dict) or not entry["Expect JSON"]):
+            raise ValueError(f"\"{name}\": \"Expect JSON\" must be an object of dotted paths to expected values")
+        if probe_type == "tcp":
+            if "Expect Body" in entry or "Expect JSON" in entry:
+                raise ValueError(f"\"{name}\": TCP probes cannot check the response body")
+            try:
+                get_tcp_address(entry)
+            except ValueError as e:
+                raise ValueError(f"\"{name}\": {e}") from e
+        server = dict(entry)
+        server["Type"] = probe_type
+        server["Required Status Code"] = codes
+        server["Interval"] = interval
+        servers.append(server)
+    return servers
+
+
+class MonitorConfig:
+    """Watched config.json; readers always see one complete, validated snapshot."""
+
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._snapshot = ([], {})
+        self.reload()
+
+    @property
+    def servers(self):
+        return self._snapshot[0]
+
+    @property
+    def by_name(self):
+        return self._snapshot[1]
+
+    def reload(self):
+        """Load and validate the file, then swap it in; the old config stays on error."""
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime
+            # Remember the attempt even if it fails so a broken file is reported once
+            self._mtime = mtime
+            with open(self.path, "r") as file:
+                servers = validate_servers(json.load(file))
+            self._snapshot = (servers, {server["Name"]: server for server in servers})
+            return servers
+
+    def reload_if_changed(self):
+        """Reload when the file changed; returns the new server list or None."""
+        try:
+            if os.stat(self.path).st_mtime == self._mtime:
+                return None
+        except FileNotFoundError:
+            logging.error(f"Monitoring config {self.path} is missing; keeping the current config.")
+            return None
+        return self.reload()
+
+
+monitor_config = MonitorConfig(MONITOR_CONFIG_FILE)
@@ -0,0 +1,252 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+load_dotenv()
+
+PROBE_DB_FILE = os.getenv("PROBE_DB_FILE", "probe_history.db")
+# Raw probes answer exact percentiles for recent windows; hourly rollups cover the rest
+PROBE_RAW_RETENTION_HOURS = int(os.getenv("PROBE_RAW_RETENTION_HOURS", "48"))
+PROBE_ROLLUP_RETENTION_DAYS = int(os.getenv("PROBE_ROLLUP_RETENTION_DAYS", "30"))
+# Upper bounds (ms) of the latency histogram kept per hourly rollup; the last bucket is open-ended
+LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+_init_lock = threading.Lock()
+_initialized = False
+
+
+@contextmanager
+def _connect():
+    conn = sqlite3.connect(PROBE_DB_FILE, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def init_store():
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        with _connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS probes ("
+                " target TEXT NOT NULL,"
+                " ts INTEGER NOT NULL,"
+                " status_code INTEGER,"
+                " latency_ms REAL,"
+                " ok INTEGER NOT NULL,"
+                " error TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_probes_target_ts ON probes (target, ts)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS probes_hourly ("
+                " target TEXT NOT NULL,"
+                " hour INTEGER NOT NULL,"
+                " count INTEGER NOT NULL,"
+                " ok_count INTEGER NOT NULL,"
+                " latency_sum REAL NOT NULL,"
+                " histogram TEXT NOT NULL,"
+                " PRIMARY KEY (target, hour))"
+            )
+        _initialized = True
+
+
+def _error_class(result):
+    if result["timed_out"]:
+        return "Timeout"
+    if result["error"] is not None:
+        return type(result["error"]).__name__
+    if result["assertion"] is not None:
+        return "Assertion"
+    if not result["ok"]:
+        return "StatusCode"
+    if result["slow"]:
+        # Still counted as up; the class records the latency SLO breach
+        return "Slow"
+    return None
+
+
+def record_probes(results):
+    """Append health-check result dicts from health_utils to the probe history."""
+    init_store()
+    now = int(time.time())
+    with _connect() as conn:
+        conn.executemany(
+            "INSERT INTO probes (target, ts, status_code, latency_ms, ok, error) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    result["server"]["Name"],
+                    now,
+                    result["status_code"],
+                    None if result["response_time"] is None else result["response_time"] * 1000,
+                    int(result["ok"]),
+                    _error_class(result),
+                )
+                for result in results
+            ],
+        )
+
+
+def _bucket_index(latency_ms):
+    for i, bound in enumerate(LATENCY_BUCKETS_MS):
+        if latency_ms <= bound:
+            return i
+    return len(LATENCY_BUCKETS_MS)
+
+
+def maintain():
+    """Roll completed hours of raw probes into hourly histograms and apply retention."""
+    init_store()
+    now = int(time.time())
+    current_hour = now - now % 3600
+    with _connect() as conn:
+        last = conn.execute("SELECT MAX(hour) FROM probes_hourly").fetchone()[0]
+        start = 0 if last is None else last + 3600
+        rollups = {}
+        for target, ts, latency_ms, ok in conn.execute(
+            "SELECT target, ts, latency_ms, ok FROM probes WHERE ts >= ? AND ts < ?",
+            (start, current_hour),
+        ):
+            key = (target, ts - ts % 3600)
+            rollup = rollups.setdefault(key, [0, 0, 0.0, [0] * (len(LATENCY_BUCKETS_MS) + 1)])
+            rollup[0] += 1
+            rollup[1] += ok
+            if latency_ms is not None:
+                rollup[2] += latency_ms
+                rollup[3][_bucket_index(latency_ms)] += 1
+        conn.executemany(
+            "INSERT OR REPLACE INTO probes_hourly (target, hour, count, ok_count, latency_sum, histogram)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            [(target, hour, *rollup[:3], json.dumps(rollup[3])) for (target, hour), rollup in rollups.items()],
+        )
+        conn.execute("DELETE FROM probes WHERE ts < ?", (now - PROBE_RAW_RETENTION_HOURS * 3600,))
+        conn.execute("DELETE FROM probes_hourly WHERE hour < ?", (now - PROBE_ROLLUP_RETENTION_DAYS * 86400,))
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(int(round(q / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def _histogram_percentile(histogram, q):
+    total = sum(histogram)
+    if not total:
+        return None
+    threshold = q / 100 * total
+    cumulative = 0
+    for i, count in enumerate(histogram):
+        cumulative += count
+        if cumulative >= threshold:
+            # Report the bucket's upper bound; the open-ended bucket reports the last bound
+            return LATENCY_BUCKETS_MS[min(i, len(LATENCY_BUCKETS_MS) - 1)]
+    return LATENCY_BUCKETS_MS[-1]
+
+
+def get_stats(target, window_seconds):
+    """Return count, uptime % and p50/p95/p99 latency (ms) for target over the window.
+
+    Windows inside the raw retention are exact; longer windows use the hourly
+    histograms and report percentiles as bucket upper bounds.
+    """
+    init_store()
+    since = int(time.time()) - window_seconds
+    with _connect() as conn:
+        if window_seconds <= PROBE_RAW_RETENTION_HOURS * 3600:
+            rows = conn.execute(
+                "SELECT latency_ms, ok FROM probes WHERE target = ? AND ts >= ?", (target, since)
+            ).fetchall()
+            latencies = sorted(latency for latency, _ in rows if latency is not None)
+            count = len(rows)
+            ok_count = sum(ok for _, ok in rows)
+            percentiles = {q: _percentile(latencies, q) for q in (50, 95, 99)}
+        else:
+            # Completed hours come from rollups, the current partial hour from raw probes
+            rollup_until = conn.execute("SELECT MAX(hour) FROM probes_hourly").fetchone()[0]
+            raw_since = since if rollup_until is None else max(since, rollup_until + 3600)
+            histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+            count = ok_count = 0
+            for rollup_count, rollup_ok, rollup_histogram in conn.execute(
+                "SELECT count, ok_count, histogram FROM probes_hourly WHERE target = ? AND hour >= ?",
+                (target, since - since % 3600),
+            ):
+                count += rollup_count
+                ok_count += rollup_ok
+                histogram = [a + b for a, b in zip(histogram, json.loads(rollup_histogram))]
+            for latency_ms, ok in conn.execute(
+                "SELECT latency_ms, ok FROM probes WHERE target = ? AND ts >= ?", (target, raw_since)
+            ):
+                count += 1
+                ok_count += ok
+                if latency_ms is not None:
+                    histogram[_bucket_index(latency_ms)] += 1
+            percentiles = {q: _histogram_percentile(histogram, q) for q in (50, 95, 99)}
+    return {
+        "count": count,
+        "uptime": None if not count else ok_count / count * 100,
+        "p50": percentiles[50],
+        "p95": percentiles[95],
+        "p99": percentiles[99],
+    }
+
+
+def get_latency_series(target, window_seconds):
+    """Return [(ts, latency_ms, ok), ...] for target, hourly averages beyond raw retention."""
+    init_store()
+    since = int(time.time()) - window_seconds
+    with _connect() as conn:
+        if window_seconds <= PROBE_RAW_RETENTION_HOURS * 3600:
+            return conn.execute(
+                "SELECT ts, latency_ms, ok FROM probes WHERE target = ? AND ts >= ? ORDER BY ts",
+                (target, since),
+            ).fetchall()
+        # Completed hours come from rollups, hours not yet rolled up from raw probes,
+        # matching how get_stats covers the same window
+        rollup_until = conn.execute("SELECT MAX(hour) FROM probes_hourly").fetchone()[0]
+        raw_since = since if rollup_until is None else max(since, rollup_until + 3600)
+        series = conn.execute(
+            "SELECT hour, latency_sum / count, ok_count = count FROM probes_hourly"
+            " WHERE target = ? AND hour >= ? AND count > 0 ORDER BY hour",
+            (target, since - since % 3600),
+        ).fetchall()
+        series += conn.execute(
+            "SELECT ts - ts % 3600 AS hour, SUM(COALESCE(latency_ms, 0)) / COUNT(*), SUM(ok) = COUNT(*)"
+            " FROM probes WHERE target = ? AND ts >= ? GROUP BY hour ORDER BY hour",
+            (target, raw_since),
+        ).fetchall()
+        return series
+
+
+def render_latency_chart(target, window_seconds, path):
+    """Plot latency over the window to a PNG at path; failed probes are marked in red."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from datetime import datetime
+
+    series = get_latency_series(target, window_seconds)
+    fig, ax = plt.subplots(figsize=(10, 4))
+    try:
+        times = [datetime.fromtimestamp(ts) for ts, _, _ in series]
+        ax.plot(times, [latency for _, latency, _ in series], linewidth=1)
+        failures = [(t, latency) for t, (_, latency, ok) in zip(times, series) if not ok and latency is not None]
+        if failures:
+            ax.scatter(*zip(*failures), color="red", s=12, label="failed")
+            ax.legend()
+        ax.set_title(f"{target} latency")
+        ax.set_ylabel("ms")
+        fig.autofmt_xdate()
+        fig.savefig(path, dpi=100, bbox_inches="tight")
+    finally:
+        plt.close(fig)
+    return path
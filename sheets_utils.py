@@ -1,14 +1,20 @@
 import os
 import json
 import gspread
-from googleapiclient.discovery import build
 from datetime import datetime, timedelta
 import tempfile
-from googleapiclient.http import MediaFileUpload
+import threading
+import logging
+import time
+from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
 from dotenv import load_dotenv
 load_dotenv()
-import pandas as pd
-from openpyxl import load_workbook
+from update_store import get_unsynced_updates, begin_sync, finish_sync
+from metadata_cache import MetadataCache
+from googleapiclient.errors import HttpError
+from bot_metrics import track_google_operation, instrument_requests_session, instrument_httplib2
+from backup_retention import select_expired_backups
+from google_client import batch_execute, call_with_retry, execute, rate_limit_http, rate_limit_session
 import pickle
 
 SCOPES = [
@@ -16,43 +22,138 @@ SCOPES = [
     'https://www.googleapis.com/auth/drive'
 ]
 
-# OAuth2 user authentication
-with open('token.pickle', 'rb') as token:
-    creds = pickle.load(token)
+TOKEN_FILE = 'token.pickle'
+
+
+class GoogleAuthUnavailable(Exception):
+    pass
+
+
+_clients_lock = threading.Lock()
+_creds = None
+_gc = None
+_drive_service = None
+
+
+def _get_credentials():
+    """Load OAuth2 user credentials on first use and refresh them once expired."""
+    global _creds
+    if _creds is None:
+        try:
+            with open(TOKEN_FILE, 'rb') as token:
+                _creds = pickle.load(token)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            raise GoogleAuthUnavailable(f"Cannot load {TOKEN_FILE}; run authorize_google.py ({e})") from e
+    if not _creds.valid:
+        if not (_creds.expired and _creds.refresh_token):
+            raise GoogleAuthUnavailable(f"{TOKEN_FILE} is invalid and cannot be refreshed; run authorize_google.py")
+        from google.auth.transport.requests import Request
+        try:
+            _creds.refresh(Request())
+        except Exception as e:
+            raise GoogleAuthUnavailable(f"Refreshing Google credentials failed: {e}") from e
+        with open(TOKEN_FILE, 'wb') as token:
+            pickle.dump(_creds, token)
+    return _creds
+
+
+def get_gspread_client():
+    """Return the shared gspread client, authorising it on first use."""
+    global _gc
+    with _clients_lock:
+        creds = _get_credentials()
+        if _gc is None:
+            _gc = gspread.authorize(creds)
+            # Count every Sheets HTTP request, attributed to the calling function
+            instrument_requests_session(_gc.http_client.session, 'sheets')
+            rate_limit_session(_gc.http_client.session, 'sheets')
+        return _gc
+
+
+def get_drive_service():
+    """Return the shared Drive v3 client, building it on first use."""
+    global _drive_service
+    with _clients_lock:
+        creds = _get_credentials()
+        if _drive_service is None:
+            # Deferred: the discovery client is slow to import and only backups need it
+            from googleapiclient.discovery import build
+            from google_auth_httplib2 import AuthorizedHttp
+            http = rate_limit_http(instrument_httplib2(AuthorizedHttp(creds), 'drive'), 'drive')
+            _drive_service = build('drive', 'v3', http=http, cache_discovery=False)
+        return _drive_service
 
-gc = gspread.authorize(creds)
-drive_service = build('drive', 'v3', credentials=creds)
 
 SPREADSHEET_ID = os.getenv('SPREADSHEET_ID')
 SPREADSHEET_NAME = os.getenv('SPREADSHEET_NAME', 'TeamUpdates')
 BACKUP_FOLDER_NAME = os.getenv('BACKUP_FOLDER_NAME', 'Backups')
 BACKUP_FOLDER_ID = os.getenv('GOOGLE_BACKUP_FOLDER_ID')
 OTHER_FOLDER_ID = os.getenv('GOOGLE_OTHER_FOLDER_ID')
+# Keep each append request small; request pacing is handled by google_client's token buckets
+SHEETS_APPEND_CHUNK_ROWS = int(os.getenv('SHEETS_APPEND_CHUNK_ROWS', '500'))
+# The trailing ID column holds the local update ID used to deduplicate retried pushes
+SHEET_HEADER = ["Date", "Time", "Update Text", "ID"]
+# Drive transfers stream in chunks (multiples of 256 KiB) so memory stays bounded
+DRIVE_CHUNK_SIZE = int(os.getenv('DRIVE_CHUNK_SIZE', str(8 * 1024 * 1024)))
+DRIVE_TRANSFER_RETRIES = int(os.getenv('DRIVE_TRANSFER_RETRIES', '5'))
+XLSX_MIME_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# Spreadsheet, worksheet and Drive IDs are cached so steady-state runs only move data
+METADATA_CACHE_FILE = os.getenv('METADATA_CACHE_FILE', 'google_metadata_cache.json')
+METADATA_CACHE_TTL = int(os.getenv('METADATA_CACHE_TTL', str(6 * 60 * 60)))
+metadata_cache = MetadataCache(METADATA_CACHE_FILE, ttl=METADATA_CACHE_TTL)
+# gspread handles cannot be persisted, so they live in a memory-only cache
+_handle_cache = MetadataCache(ttl=METADATA_CACHE_TTL)
 
 
-def get_or_create_spreadsheet():
+@track_google_operation
+def open_spreadsheet():
+    """Return a cached handle to the team spreadsheet, creating it if needed."""
     global SPREADSHEET_ID
-    if SPREADSHEET_ID:
+    sh = _handle_cache.get('spreadsheet')
+    if sh is not None:
+        return sh
+    spreadsheet_id = SPREADSHEET_ID or metadata_cache.get('spreadsheet_id')
+    sh = None
+    if spreadsheet_id:
         try:
-            gc.open_by_key(SPREADSHEET_ID)
-            return SPREADSHEET_ID
-        except Exception:
+            sh = call_with_retry(get_gspread_client().open_by_key, spreadsheet_id)
+        except gspread.exceptions.SpreadsheetNotFound:
             pass
-    sh = gc.create(SPREADSHEET_NAME)
+    if sh is None:
+        sh = call_with_retry(get_gspread_client().create, SPREADSHEET_NAME, idempotent=False)
+        # Remember the created spreadsheet so a restart does not create another one
+        metadata_cache.set('spreadsheet_id', sh.id, ttl=None)
     SPREADSHEET_ID = sh.id
-    return SPREADSHEET_ID
+    _handle_cache.set('spreadsheet', sh)
+    return sh
+
+
+@track_google_operation
+def get_or_create_spreadsheet():
+    return open_spreadsheet().id
+
+
+def invalidate_spreadsheet_cache():
+    """Forget the spreadsheet handle and worksheet map, e.g. after a 404."""
+    _handle_cache.invalidate()
+    metadata_cache.invalidate('worksheets:')
 
 
+def _is_not_found(error):
+    if isinstance(error, HttpError):
+        return error.resp.status == 404
+    if isinstance(error, gspread.exceptions.APIError):
+        # A deleted tab surfaces as 400 "Unable to parse range" rather than 404
+        return error.response.status_code in (400, 404)
+    return False
+
+
+@track_google_operation
 def get_or_create_user_sheet(spreadsheet_id, username):
-    sh = gc.open_by_key(spreadsheet_id)
-    try:
-        worksheet = sh.worksheet(username)
-    except gspread.exceptions.WorksheetNotFound:
-        worksheet = sh.add_worksheet(title=username, rows="1000", cols="3")
-        worksheet.append_row(["Date", "Time", "Update Text"])
-    return worksheet
+    return ensure_user_sheets(open_spreadsheet(), [username])[username]
 
 
+@track_google_operation
 def append_update(username, update_text):
     spreadsheet_id = get_or_create_spreadsheet()
     worksheet = get_or_create_user_sheet(spreadsheet_id, username)
@@ -64,17 +165,30 @@ def append_update(username, update_text):
     ])
 
 
+@track_google_operation
 def get_drive_file_id_by_name(name, mime_type=None, parent=None):
+    cache_key = _drive_cache_key(name, mime_type, parent)
+    file_id = metadata_cache.get(cache_key)
+    if file_id:
+        return file_id
     query = f"name='{name}' and trashed=false"
     if mime_type:
         query += f" and mimeType='{mime_type}'"
     if parent:
         query += f" and '{parent}' in parents"
-    results = drive_service.files().list(q=query, fields="files(id, name)").execute()
+    results = execute(get_drive_service().files().list(q=query, fields="files(id, name)"))
     files = results.get('files', [])
-    return files[0]['id'] if files else None
+    if not files:
+        return None
+    metadata_cache.set(cache_key, files[0]['id'])
+    return files[0]['id']
 
 
+def _drive_cache_key(name, mime_type=None, parent=None):
+    return f"drive:{parent}:{mime_type}:{name}"
+
+
+@track_google_operation
 def get_or_create_backup_folder():
     folder_id = get_drive_file_id_by_name(BACKUP_FOLDER_NAME, mime_type='application/vnd.google-apps.folder')
     if folder_id:
@@ -83,69 +197,200 @@ def get_or_create_backup_folder():
         'name': BACKUP_FOLDER_NAME,
         'mimeType': 'application/vnd.google-apps.folder'
     }
-    folder = drive_service.files().create(body=file_metadata, fields='id').execute()
+    folder = execute(get_drive_service().files().create(body=file_metadata, fields='id'), idempotent=False)
+    metadata_cache.set(_drive_cache_key(BACKUP_FOLDER_NAME, 'application/vnd.google-apps.folder'), folder.get('id'))
     return folder.get('id')
 
 
-def export_and_backup_spreadsheet():
-    spreadsheet_id = get_or_create_spreadsheet()
-    sh = gc.open_by_key(spreadsheet_id)
+def download_to_file(request, file):
+    """Download a media request into file in DRIVE_CHUNK_SIZE pieces, resuming after transient errors."""
+    downloader = MediaIoBaseDownload(file, request, chunksize=DRIVE_CHUNK_SIZE)
+    done = False
+    while not done:
+        _status, done = _next_chunk_with_resume(downloader.next_chunk)
+    file.flush()
+
+
+def execute_resumable(request):
+    """Drive a resumable upload chunk by chunk; a failed chunk resumes instead of restarting."""
+    response = None
+    while response is None:
+        _status, response = _next_chunk_with_resume(request.next_chunk)
+    return response
+
+
+def _next_chunk_with_resume(next_chunk):
+    # next_chunk already retries 5xx/429 responses; this also survives dropped
+    # connections, resuming the transfer from the last acknowledged byte
+    for attempt in range(DRIVE_TRANSFER_RETRIES):
+        try:
+            return next_chunk(num_retries=DRIVE_TRANSFER_RETRIES)
+        except OSError:
+            # Covers ConnectionError and socket timeouts
+            if attempt == DRIVE_TRANSFER_RETRIES - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+
+@track_google_operation
+def export_and_backup_spreadsheet(prune=True):
+    sh = open_spreadsheet()
     spreadsheet_name = sh.title
-    # Find Google Sheets file in Drive
-    file_id = get_drive_file_id_by_name(spreadsheet_name, mime_type='application/vnd.google-apps.spreadsheet')
-    if not file_id:
-        raise Exception('Spreadsheet not found in Drive')
+    # A Google Sheets spreadsheet ID is also its Drive file ID
+    file_id = sh.id
     # Export as XLSX
-    request = drive_service.files().export_media(fileId=file_id, mimeType='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    request = get_drive_service().files().export_media(fileId=file_id, mimeType=XLSX_MIME_TYPE)
     today = datetime.now().strftime('%Y-%m-%d')
     backup_filename = f"{today}_{spreadsheet_name}.xlsx"
     backup_folder_id = BACKUP_FOLDER_ID or get_or_create_backup_folder()
-    with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-        tmp_file.write(request.execute())
-        tmp_file.flush()
+    # Stream the export to disk chunk by chunk, then upload it with a resumable session
+    tmp_file = tempfile.NamedTemporaryFile(delete=False)
+    try:
+        with tmp_file:
+            try:
+                download_to_file(request, tmp_file)
+            except HttpError as e:
+                if _is_not_found(e):
+                    invalidate_spreadsheet_cache()
+                    raise Exception('Spreadsheet not found in Drive') from e
+                raise
         # Upload to backup folder
         file_metadata = {
             'name': backup_filename,
             'parents': [backup_folder_id]
         }
-        media = MediaFileUpload(tmp_file.name, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        drive_service.files().create(body=file_metadata, media_body=media, fields='id').execute()
-    os.unlink(tmp_file.name)
-    delete_old_backups(backup_folder_id, spreadsheet_name)
+        media = MediaFileUpload(tmp_file.name, mimetype=XLSX_MIME_TYPE, chunksize=DRIVE_CHUNK_SIZE, resumable=True)
+        execute_resumable(get_drive_service().files().create(body=file_metadata, media_body=media, fields='id'))
+    finally:
+        os.unlink(tmp_file.name)
+    if prune:
+        delete_old_backups(backup_folder_id, spreadsheet_name)
     return backup_filename
 
 
+@track_google_operation
+def prune_old_backups():
+    """Apply backup retention to the backup folder of the team spreadsheet."""
+    backup_folder_id = BACKUP_FOLDER_ID or get_or_create_backup_folder()
+    return delete_old_backups(backup_folder_id, open_spreadsheet().title)
+
+
+@track_google_operation
+def list_backup_files(folder_id, spreadsheet_name):
+    """List every backup of spreadsheet_name in folder_id, following all result pages."""
+    drive_service = get_drive_service()
+    files = []
+    page_token = None
+    while True:
+        results = execute(drive_service.files().list(
+            q=f"'{folder_id}' in parents and trashed=false and name contains '{spreadsheet_name}'",
+            fields="nextPageToken, files(id, name, createdTime)",
+            pageSize=1000,
+            pageToken=page_token,
+        ))
+        files.extend(results.get('files', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return files
+
+
+@track_google_operation
 def delete_old_backups(folder_id, spreadsheet_name):
-    results = drive_service.files().list(q=f"'{folder_id}' in parents and trashed=false and name contains '{spreadsheet_name}'", fields="files(id, name, createdTime)").execute()
-    files = results.get('files', [])
-    now = datetime.now()
-    for file in files:
-        try:
-            file_date = datetime.strptime(file['name'][:10], '%Y-%m-%d')
-            if (now - file_date).days > 7:
-                drive_service.files().delete(fileId=file['id']).execute()
-        except Exception:
-            continue 
+    """Delete backups no retention policy keeps; returns the number deleted."""
+    drive_service = get_drive_service()
+    expired = select_expired_backups(list_backup_files(folder_id, spreadsheet_name))
+    # Delete in batched requests; a file that is already gone counts as deleted
+    responses = batch_execute(drive_service, [drive_service.files().delete(fileId=file['id']) for file in expired])
+    deleted = 0
+    for file, (_response, exception) in zip(expired, responses):
+        if exception is None or _is_not_found(exception):
+            deleted += 1
+        else:
+            logging.warning(f"Failed to delete old backup {file['name']}: {exception}")
+    return deleted
+
 
-LOCAL_EXCEL_FILE = 'local_updates.xlsx'
+@track_google_operation
+def ensure_user_sheets(sh, usernames):
+    """Return {username: worksheet}, creating all missing user tabs in one batch.
 
+    Worksheet properties are cached by title, so known tabs cost no API call.
+    """
+    cache_key = f"worksheets:{sh.id}"
+    properties = metadata_cache.get(cache_key) or {}
+    if any(username not in properties for username in usernames):
+        properties = {
+            sheet["properties"]["title"]: sheet["properties"]
+            for sheet in call_with_retry(sh.fetch_sheet_metadata)["sheets"]
+        }
+        missing = [username for username in usernames if username not in properties]
+        if missing:
+            response = call_with_retry(sh.batch_update, {"requests": [
+                {"addSheet": {"properties": {
+                    "title": username,
+                    "gridProperties": {"rowCount": 1000, "columnCount": len(SHEET_HEADER)},
+                }}}
+                for username in missing
+            ]}, idempotent=False)
+            for reply in response.get("replies", []):
+                added = reply["addSheet"]["properties"]
+                properties[added["title"]] = added
+            call_with_retry(sh.values_batch_update, {
+                "valueInputOption": "RAW",
+                "data": [
+                    {"range": f"'{_quote_sheet_title(username)}'!A1", "values": [SHEET_HEADER]}
+                    for username in missing
+                ],
+            })
+        metadata_cache.set(cache_key, properties)
+    return {username: gspread.Worksheet(sh, properties[username], sh.id, sh.client) for username in usernames}
+
+
+def _quote_sheet_title(title):
+    return title.replace("'", "''")
+
+
+@track_google_operation
 def push_local_updates_to_gsheets():
-    spreadsheet_id = get_or_create_spreadsheet()
-    try:
-        book = load_workbook(LOCAL_EXCEL_FILE)
-        for username in book.sheetnames:
-            df = pd.read_excel(LOCAL_EXCEL_FILE, sheet_name=username)
-            for _, row in df.iterrows():
-                # Append each row to the corresponding user sheet in Google Sheets
-                worksheet = get_or_create_user_sheet(spreadsheet_id, username)
-                worksheet.append_row([
-                    str(row['Date']),
-                    str(row['Time']),
-                    str(row['Update Text'])
-                ])
-    except FileNotFoundError:
-        pass  # No local updates to push 
+    """Push only the updates past each user's sync cursor; returns the number of rows pushed.
+
+    Every row carries its local ID in the last column, so a push interrupted between
+    appending and advancing the cursor is deduplicated on the next run.
+    """
+    unsynced = get_unsynced_updates()
+    if not unsynced:
+        return 0
+    sh = open_spreadsheet()
+    worksheets = ensure_user_sheets(sh, list(unsynced))
+    pushed = 0
+    for username, entry in unsynced.items():
+        worksheet = worksheets[username]
+        rows = entry["rows"]
+        last_id = rows[-1][0]
+        if entry["pending_id"] is not None:
+            # The previous push was interrupted; skip rows that already reached the sheet
+            remote_ids = set(call_with_retry(worksheet.col_values, len(SHEET_HEADER)))
+            rows = [(update_id, row) for update_id, row in rows if str(update_id) not in remote_ids]
+        for start in range(0, len(rows), SHEETS_APPEND_CHUNK_ROWS):
+            chunk = rows[start:start + SHEETS_APPEND_CHUNK_ROWS]
+            begin_sync(username, chunk[-1][0])
+            try:
+                call_with_retry(
+                    worksheet.append_rows,
+                    [[str(value) for value in row] + [str(update_id)] for update_id, row in chunk],
+                    value_input_option='RAW',
+                    idempotent=False,
+                )
+            except gspread.exceptions.APIError as e:
+                if _is_not_found(e):
+                    invalidate_spreadsheet_cache()
+                raise
+            finish_sync(username, chunk[-1][0])
+            pushed += len(chunk)
+        finish_sync(username, last_id)
+    return pushed
 
+@track_google_operation
 def upload_file_to_other_folder(local_file_path, filename=None, mime_type=None):
     """Upload a file to the folder specified by OTHER_FOLDER_ID, replacing if it already exists."""
     folder_id = OTHER_FOLDER_ID
@@ -157,27 +402,31 @@ def upload_file_to_other_folder(local_file_path, filename=None, mime_type=None):
         import mimetypes
         mime_type = mimetypes.guess_type(local_file_path)[0] or 'application/octet-stream'
     print(f"Uploading file {filename} to folder {folder_id} with MIME type {mime_type}")
-    # Search for existing file with the same name in the folder
-    query = f"'{folder_id}' in parents and name='{filename}' and trashed=false"
-    results = drive_service.files().list(q=query, fields="files(id, name)").execute()
-    files = results.get('files', [])
-    media = MediaFileUpload(local_file_path, mimetype=mime_type, resumable=True)
-    if files:
+    # Look up an existing file with the same name in the folder
+    file_id = get_drive_file_id_by_name(filename, parent=folder_id)
+    media = MediaFileUpload(local_file_path, mimetype=mime_type, chunksize=DRIVE_CHUNK_SIZE, resumable=True)
+    if file_id:
         # Replace (update) the existing file
-        file_id = files[0]['id']
-        drive_service.files().update(
-            fileId=file_id,
-            media_body=media,
-            fields='id'
-        ).execute()
-    else:
-        # Create new file in the folder
-        file_metadata = {
-            'name': filename,
-            'parents': [folder_id]
-        }
-        drive_service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute() 
\ No newline at end of file
+        try:
+            execute_resumable(get_drive_service().files().update(
+                fileId=file_id,
+                media_body=media,
+                fields='id'
+            ))
+            return
+        except HttpError as e:
+            if not _is_not_found(e):
+                raise
+            # The cached file is gone; fall through and create it again
+            metadata_cache.invalidate(_drive_cache_key(filename, parent=folder_id))
+    # Create new file in the folder
+    file_metadata = {
+        'name': filename,
+        'parents': [folder_id]
+    }
+    created = execute_resumable(get_drive_service().files().create(
+        body=file_metadata,
+        media_body=media,
+        fields='id'
+    ))
+    metadata_cache.set(_drive_cache_key(filename, parent=folder_id), created.get('id'))
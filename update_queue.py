@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+
+from dotenv import load_dotenv
+from update_store import append_updates_local
+from bot_metrics import UPDATE_BATCH_SIZE, UPDATE_QUEUE_DEPTH, UPDATE_WRITE_SECONDS
+load_dotenv()
+
+# Submissions arriving within this window are written in one batch
+UPDATE_BATCH_WINDOW_MS = int(os.getenv("UPDATE_BATCH_WINDOW_MS", "50"))
+UPDATE_BATCH_MAX = int(os.getenv("UPDATE_BATCH_MAX", "100"))
+# Bounded backlog; submitters wait up to UPDATE_ENQUEUE_TIMEOUT seconds for room
+UPDATE_QUEUE_MAX = int(os.getenv("UPDATE_QUEUE_MAX", "1000"))
+UPDATE_ENQUEUE_TIMEOUT = float(os.getenv("UPDATE_ENQUEUE_TIMEOUT", "2"))
+
+
+class UpdateQueueFull(Exception):
+    pass
+
+
+class UpdateWriter:
+    """Single writer task that batches /update submissions into the local store."""
+
+    def __init__(self):
+        self._queue = None
+        self._task = None
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue(maxsize=UPDATE_QUEUE_MAX)
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, username, update_text):
+        """Queue an update and return once it has been durably written.
+
+        Raises UpdateQueueFull if the backlog stays full for UPDATE_ENQUEUE_TIMEOUT.
+        """
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        entry = (username, update_text, datetime.now())
+        try:
+            await asyncio.wait_for(self._queue.put((entry, future)), UPDATE_ENQUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise UpdateQueueFull(f"{self._queue.qsize()} updates are waiting to be saved")
+        UPDATE_QUEUE_DEPTH.set(self._queue.qsize())
+        await future
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        # Give concurrent submitters a short window to join this batch
+        await asyncio.sleep(UPDATE_BATCH_WINDOW_MS / 1000)
+        while len(batch) < UPDATE_BATCH_MAX:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            UPDATE_QUEUE_DEPTH.set(self._queue.qsize())
+            UPDATE_BATCH_SIZE.observe(len(batch))
+            try:
+                with UPDATE_WRITE_SECONDS.time():
+                    await asyncio.to_thread(append_updates_local, [entry for entry, _ in batch])
+            except Exception as e:
+                logging.exception(f"Failed to write {len(batch)} updates")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def close(self):
+        """Flush everything already queued, then stop the writer task."""
+        if self._task is None:
+            return
+        if not self._task.done():
+            await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+update_writer = UpdateWriter()
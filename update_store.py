@@ -0,0 +1,360 @@
+import csv
+import logging
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+load_dotenv()
+
+LOCAL_DB_FILE = os.getenv("LOCAL_UPDATES_DB", "local_updates.db")
+LOCAL_EXCEL_FILE = 'local_updates.xlsx'
+COLUMNS = ["Date", "Time", "Update Text"]
+COLUMN_WIDTH = 40
+
+_init_lock = threading.Lock()
+_initialized = False
+# False when SQLite was built without FTS5; search then falls back to LIKE scans
+_fts_enabled = False
+
+
+@contextmanager
+def _connect():
+    """Open the store, commit on success and always close the connection."""
+    conn = sqlite3.connect(LOCAL_DB_FILE, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        # FULL makes every commit fsync the WAL before it returns
+        conn.execute("PRAGMA synchronous=FULL")
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def init_store():
+    """Create the store tables and import a legacy local_updates.xlsx once."""
+    global _initialized, _fts_enabled
+    with _init_lock:
+        if _initialized:
+            return
+        with _connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS updates ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " username TEXT NOT NULL,"
+                " date TEXT NOT NULL,"
+                " time TEXT NOT NULL,"
+                " update_text TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_updates_user_id ON updates (username, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_updates_user_date ON updates (username, date, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_updates_date ON updates (date, id)")
+            _fts_enabled = _create_search_index(conn)
+            # Google Sheets high-water mark per user; pending_id is set while a push is in flight
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sync_cursors ("
+                " username TEXT PRIMARY KEY,"
+                " synced_id INTEGER NOT NULL DEFAULT 0,"
+                " pending_id INTEGER)"
+            )
+            # Fingerprint of each workbook partition as of its last upload
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS export_state ("
+                " partition TEXT PRIMARY KEY,"
+                " fingerprint TEXT NOT NULL)"
+            )
+            empty = conn.execute("SELECT 1 FROM updates LIMIT 1").fetchone() is None
+            if empty and os.path.exists(LOCAL_EXCEL_FILE):
+                conn.executemany(
+                    "INSERT INTO updates (username, date, time, update_text) VALUES (?, ?, ?, ?)",
+                    _read_legacy_excel(LOCAL_EXCEL_FILE),
+                )
+        _initialized = True
+
+
+def _create_search_index(conn):
+    """Create the FTS5 index over update_text, kept in sync by triggers; False if FTS5 is missing."""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'updates_fts'").fetchone() is not None
+    try:
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS updates_fts"
+            " USING fts5(update_text, content='updates', content_rowid='id')"
+        )
+    except sqlite3.OperationalError as e:
+        logging.warning(f"Full-text search unavailable, falling back to substring search: {e}")
+        return False
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS updates_fts_insert AFTER INSERT ON updates BEGIN"
+        " INSERT INTO updates_fts (rowid, update_text) VALUES (new.id, new.update_text); END"
+    )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS updates_fts_delete AFTER DELETE ON updates BEGIN"
+        " INSERT INTO updates_fts (updates_fts, rowid, update_text) VALUES ('delete', old.id, old.update_text); END"
+    )
+    conn.execute(
+        "CREATE TRIGGER IF NOT EXISTS updates_fts_update AFTER UPDATE OF update_text ON updates BEGIN"
+        " INSERT INTO updates_fts (updates_fts, rowid, update_text) VALUES ('delete', old.id, old.update_text);"
+        " INSERT INTO updates_fts (rowid, update_text) VALUES (new.id, new.update_text); END"
+    )
+    if not exists:
+        # Index updates stored before search existed
+        conn.execute("INSERT INTO updates_fts (updates_fts) VALUES ('rebuild')")
+    return True
+
+
+def _read_legacy_excel(path):
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True)
+    try:
+        for ws in wb.worksheets:
+            for date, time_, text in ws.iter_rows(min_row=2, max_col=3, values_only=True):
+                if text is None:
+                    continue
+                yield ws.title, str(date), str(time_), str(text)
+    finally:
+        wb.close()
+
+
+def append_updates_local(entries):
+    """Append a batch of (username, update_text, datetime) entries in one durable transaction."""
+    init_store()
+    with _connect() as conn:
+        conn.executemany(
+            "INSERT INTO updates (username, date, time, update_text) VALUES (?, ?, ?, ?)",
+            [
+                (username, when.strftime('%Y-%m-%d'), when.strftime('%H:%M:%S'), update_text)
+                for username, update_text, when in entries
+            ],
+        )
+
+
+def append_update_local(username, update_text):
+    """Append one update to the local store; cost is independent of history size."""
+    append_updates_local([(username, update_text, datetime.now())])
+
+
+def get_updates_by_user():
+    """Return {username: [[date, time, text], ...]} in insertion order."""
+    init_store()
+    updates = {}
+    with _connect() as conn:
+        for username, date, time_, text in conn.execute(
+            "SELECT username, date, time, update_text FROM updates ORDER BY id"
+        ):
+            updates.setdefault(username, []).append([date, time_, text])
+    return updates
+
+
+def _sheet_title(username, used):
+    """Turn a display name into a valid, unique xlsx sheet title and record it in used.
+
+    Excel forbids []:*?/\\ in titles, limits them to 31 characters and compares
+    them case-insensitively.
+    """
+    title = re.sub(r"[\[\]:*?/\\]", "_", username).strip("'") or "User"
+    candidate = title[:31]
+    suffix = 1
+    while candidate.lower() in used:
+        suffix += 1
+        candidate = f"{title[:31 - len(str(suffix)) - 1]}~{suffix}"
+    used.add(candidate.lower())
+    return candidate
+
+
+def render_local_excel(path=LOCAL_EXCEL_FILE, month=None):
+    """Render the local store (or one YYYY-MM month of it) to an xlsx file, one sheet per user.
+
+    Rows are streamed from the store into a write-only workbook, so memory use
+    does not grow with history.
+    """
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+    init_store()
+    where, params = "", []
+    if month:
+        start = datetime.strptime(month, '%Y-%m')
+        end = (start + timedelta(days=32)).replace(day=1)
+        where, params = " WHERE date >= ? AND date < ?", [start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')]
+    wb = Workbook(write_only=True)
+    ws = None
+    current = None
+    titles = set()
+    with _connect() as conn:
+        for username, date, time_, text in conn.execute(
+            f"SELECT username, date, time, update_text FROM updates{where} ORDER BY username, id", params
+        ):
+            if username != current:
+                current = username
+                ws = wb.create_sheet(title=_sheet_title(username, titles))
+                # Write-only sheets need their column widths before the first row
+                for i in range(1, len(COLUMNS) + 1):
+                    ws.column_dimensions[get_column_letter(i)].width = COLUMN_WIDTH
+                ws.append(COLUMNS)
+            ws.append([date, time_, text])
+    if ws is None:
+        wb.create_sheet(title="Updates").append(COLUMNS)
+    tmp_path = path + ".tmp"
+    wb.save(tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def get_export_partitions(by_month=False):
+    """Return {partition: fingerprint} for the workbooks the store renders to.
+
+    The partition is "all", or each YYYY-MM month when by_month is set. Updates
+    are append-only, so the row count and ID range identify a partition's
+    content; both come from idx_updates_date without reading any update text.
+    """
+    init_store()
+    with _connect() as conn:
+        if not by_month:
+            count, min_id, max_id = conn.execute("SELECT COUNT(*), MIN(id), MAX(id) FROM updates").fetchone()
+            return {"all": f"{count}:{min_id}:{max_id}"}
+        return {
+            month: f"{count}:{min_id}:{max_id}"
+            for month, count, min_id, max_id in conn.execute(
+                "SELECT substr(date, 1, 7) AS month, COUNT(*), MIN(id), MAX(id) FROM updates GROUP BY month ORDER BY month"
+            )
+        }
+
+
+def get_exported_fingerprint(partition):
+    init_store()
+    with _connect() as conn:
+        row = conn.execute("SELECT fingerprint FROM export_state WHERE partition = ?", (partition,)).fetchone()
+    return row[0] if row else None
+
+
+def set_exported_fingerprint(partition, fingerprint):
+    """Record that partition was uploaded with this content."""
+    init_store()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO export_state (partition, fingerprint) VALUES (?, ?)"
+            " ON CONFLICT(partition) DO UPDATE SET fingerprint = excluded.fingerprint",
+            (partition, fingerprint),
+        )
+
+
+def get_unsynced_updates():
+    """Return {username: {"pending_id": ..., "rows": [(id, [date, time, text]), ...]}} past each sync cursor."""
+    init_store()
+    unsynced = {}
+    with _connect() as conn:
+        for update_id, username, date, time_, text, pending_id in conn.execute(
+            "SELECT u.id, u.username, u.date, u.time, u.update_text, c.pending_id"
+            " FROM updates u LEFT JOIN sync_cursors c ON c.username = u.username"
+            " WHERE u.id > COALESCE(c.synced_id, 0) ORDER BY u.id"
+        ):
+            entry = unsynced.setdefault(username, {"pending_id": pending_id, "rows": []})
+            entry["rows"].append((update_id, [date, time_, text]))
+    return unsynced
+
+
+def begin_sync(username, pending_id):
+    """Record that rows up to pending_id are about to be pushed for username."""
+    init_store()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO sync_cursors (username, pending_id) VALUES (?, ?)"
+            " ON CONFLICT(username) DO UPDATE SET pending_id = excluded.pending_id",
+            (username, pending_id),
+        )
+
+
+def finish_sync(username, synced_id):
+    """Advance the high-water mark for username once its push has succeeded."""
+    init_store()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO sync_cursors (username, synced_id, pending_id) VALUES (?, ?, NULL)"
+            " ON CONFLICT(username) DO UPDATE SET synced_id = excluded.synced_id, pending_id = NULL",
+            (username, synced_id),
+        )
+
+
+def _filters(username=None, since=None, until=None, terms=None):
+    """Build the WHERE clause shared by the query, count and export functions.
+
+    since and until are inclusive YYYY-MM-DD dates; terms are words that must
+    all appear in the update text.
+    """
+    clauses, params = [], []
+    if username:
+        clauses.append("u.username = ?")
+        params.append(username)
+    if since:
+        clauses.append("u.date >= ?")
+        params.append(since)
+    if until:
+        # Compare against the next day so legacy "YYYY-MM-DD HH:MM:SS" dates still match
+        clauses.append("u.date < ?")
+        params.append((datetime.strptime(until, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d'))
+    words = (terms or "").split()
+    if words and _fts_enabled:
+        clauses.append("u.id IN (SELECT rowid FROM updates_fts WHERE updates_fts MATCH ?)")
+        # Quote every word so user input is never parsed as FTS query syntax; * makes it a prefix match
+        params.append(" ".join('"' + word.replace('"', '""') + '"*' for word in words))
+    else:
+        for word in words:
+            clauses.append("u.update_text LIKE ? ESCAPE '\\'")
+            params.append(f"%{_escape_like(word)}%")
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def query_updates(username=None, since=None, until=None, terms=None, limit=None, newest_first=False):
+    """Return [(id, username, date, time, text), ...] matching the filters, served from the indexes."""
+    init_store()
+    where, params = _filters(username, since, until, terms)
+    sql = f"SELECT u.id, u.username, u.date, u.time, u.update_text FROM updates u{where} ORDER BY u.id"
+    if newest_first:
+        sql += " DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    with _connect() as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def count_updates(username=None, since=None, until=None, terms=None):
+    init_store()
+    where, params = _filters(username, since, until, terms)
+    with _connect() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM updates u{where}", params).fetchone()[0]
+
+
+def export_updates_csv(path, username=None, since=None, until=None, terms=None):
+    """Stream matching updates into a CSV file without loading them all; returns the row count."""
+    init_store()
+    where, params = _filters(username, since, until, terms)
+    count = 0
+    with _connect() as conn, open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["User"] + COLUMNS)
+        for row in conn.execute(
+            f"SELECT u.username, u.date, u.time, u.update_text FROM updates u{where} ORDER BY u.id", params
+        ):
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def get_usernames(search=""):
+    """Return the distinct usernames in the store containing search (case-insensitive)."""
+    init_store()
+    with _connect() as conn:
+        # Served from idx_updates_user_id without touching the table
+        rows = conn.execute(
+            "SELECT DISTINCT username FROM updates WHERE username LIKE ? ESCAPE '\\' ORDER BY username",
+            (f"%{_escape_like(search)}%",),
+        )
+        return [username for (username,) in rows]